@@ -1,39 +1,109 @@
-import ctypes
+"""Low-footprint GIF wallpaper animator.
+
+A small front end on the main engine for machines where OpenCV is missing
+or too heavy, such as low-RAM kiosks. GIFs are resized to the monitor and
+cached in AnimationFrames/ by the same EnhancedWallpaperAnimator code as
+main.py, using Pillow only, and played by its drift-corrected frame
+scheduler. Settings are picked for a small footprint: frames are decoded,
+resized with the cheap bilinear filter and encoded one at a time on a
+single thread, dropped from memory once they are staged as files, and
+staged in a plain directory rather than a RAM disk. Adaptive pacing is
+off. Cache entries are shared with main.py run with the same settings.
+"""
+import argparse
+import logging
 import os
+import signal
+import sys
 import time
-from PIL import Image
-
-# Get the current script directory
-script_dir = os.path.dirname(os.path.abspath(__file__))
-
-# Path to your GIF
-gif_path = os.path.join(script_dir, "skull spinning.gif")
-
-# Output directory for frames
-output_dir = os.path.join(script_dir, "GifFrames")
-os.makedirs(output_dir, exist_ok=True)
-
-# Load the GIF and extract frames
-gif = Image.open(gif_path)
-frames = []
-try:
-    while True:
-        frame = gif.copy()
-        frame_path = os.path.join(output_dir, f"frame_{len(frames)}.bmp")
-        frame.save(frame_path, format="BMP")
-        frames.append(frame_path)
-        gif.seek(gif.tell() + 1)
-except EOFError:
-    pass  # End of GIF frames
-
-# Function to change desktop background
-def set_wallpaper(image_path):
-    # Use ctypes to set the desktop background on Windows
-    ctypes.windll.user32.SystemParametersInfoW(20, 0, image_path, 0)
-
-# Loop through frames to create the animation effect
-frame_delay = 0.1  # Adjust this for speed (0.1 = 100ms per frame)
-while True:
-    for frame_path in frames:
-        set_wallpaper(frame_path)
-        time.sleep(frame_delay)
+
+from main import (EnhancedWallpaperAnimator, FRAME_FORMATS, RESIZE_FILTERS, STAGING_BACKENDS,
+                  WALLPAPER_SINKS, create_sink, ensure_elevated)
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_GIF = os.path.join(SCRIPT_DIR, "skullspinning.gif")
+
+# Engine settings behind the low footprint; anything not listed keeps the main.py default
+LOW_FOOTPRINT_SETTINGS = dict(
+    workers=1,
+    pipeline='inline',  # One decoded frame in flight and no decode/encode threads
+    resize_filter='bilinear',  # Much cheaper per frame than the lanczos GIF default
+    progressive='loop',  # Show frames while the GIF is first processed
+    playback='staged',  # Write every frame once, then only hand the sink a path
+    keep_frames=False,  # Once staged, frames live only in the staged files
+    staging_backend='dir',  # Staged files on disk rather than a RAM disk
+    adaptive=False,
+)
+
+def start(gif_path, **settings):
+    """Create an animator for a GIF with the low-footprint settings and start playback.
+
+    Returns the animator and the frames it plays, which fill in while a GIF
+    that isn't cached yet is processed.
+    """
+    animator = EnhancedWallpaperAnimator(input_path=gif_path, **dict(LOW_FOOTPRINT_SETTINGS, **settings))
+    frames_data, preprocess_thread = animator.load_frames()
+    if preprocess_thread is None and not frames_data:
+        raise RuntimeError(f"No frames could be loaded for {gif_path}")
+    animator.start_playback(frames_data, preprocess_thread)
+    animator.logger.info(f"Animation started with {len(frames_data)} frames. Press Ctrl+C to stop.")
+    return animator, frames_data
+
+def main():
+    parser = argparse.ArgumentParser(description="Low-footprint GIF wallpaper animator (Pillow only)")
+    parser.add_argument('gif', nargs='?', default=DEFAULT_GIF, help='GIF to animate (default: skullspinning.gif next to this script)')
+    parser.add_argument('--fps', type=int, default=15, help='Target frames per second (default: 15)')
+    parser.add_argument('--quality', type=int, default=80, help='JPEG/WebP quality (0-100, default: 80)')
+    parser.add_argument('--format', dest='frame_format', choices=list(FRAME_FORMATS), default='jpeg',
+                        help='Frame file format; bmp is cheapest for Windows to apply but the largest (default: jpeg)')
+    parser.add_argument('--scale', type=float, default=0.75, help='Scale factor for resolution (default: 0.75)')
+    parser.add_argument('--filter', dest='resize_filter', choices=sorted(RESIZE_FILTERS), default=LOW_FOOTPRINT_SETTINGS['resize_filter'],
+                        help='Resampling filter used to resize frames (default: bilinear)')
+    parser.add_argument('--cache-mb', type=int, default=2048,
+                        help='Disk budget for the AnimationFrames cache in MB, shared with main.py (default: 2048)')
+    parser.add_argument('--ram', type=int, default=512, help='Staging storage budget in MB (default: 512)')
+    parser.add_argument('--staging', dest='staging_backend', choices=sorted(STAGING_BACKENDS), default=LOW_FOOTPRINT_SETTINGS['staging_backend'],
+                        help='Where frame files for the sink are written, as in main.py (default: dir, which uses no RAM for them)')
+    parser.add_argument('--staging-path', default=None, help='Root for the staging backend (default: the backend default)')
+    parser.add_argument('--sink', choices=sorted(WALLPAPER_SINKS), default=None,
+                        help='Where frames are delivered, as in main.py (default: windows on Windows, otherwise command if --sink-command is given, else memory)')
+    parser.add_argument('--sink-command', default=None, help='Wallpaper setter command for --sink command, {path} is replaced with the frame file')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger(__name__)
+    if not args.gif.lower().endswith('.gif'):
+        logger.error(f"{args.gif} is not a GIF. Videos need OpenCV; play them with main.py.")
+        sys.exit(1)
+    if not os.path.isfile(args.gif):
+        logger.error(f"{args.gif} does not exist.")
+        sys.exit(1)
+
+    sink_name = args.sink or create_sink(command=args.sink_command).name
+    if sink_name == 'windows':
+        ensure_elevated()
+    # Exit through SystemExit on SIGTERM so atexit handlers still remove staging files
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+    animator = None
+    try:
+        animator, frames_data = start(args.gif, target_fps=args.fps, quality=args.quality, frame_format=args.frame_format,
+                                      scale_factor=args.scale, resize_filter=args.resize_filter, cache_size_mb=args.cache_mb,
+                                      ram_disk_size_mb=args.ram, staging_backend=args.staging_backend, staging_path=args.staging_path,
+                                      sink=create_sink(sink_name, args.sink_command))
+        while animator.running:
+            time.sleep(0.5)
+            if animator.out_of_frames(frames_data):
+                raise RuntimeError(f"No frames could be loaded for {args.gif}")
+    except KeyboardInterrupt:
+        logger.info("Animation stopped.")
+    except RuntimeError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    finally:
+        if animator is not None:
+            animator.stop()
+            animator.cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,452 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROCESS_START = time.perf_counter()  # Footprint runs measure startup from here, before main is imported
+
+from main import EnhancedWallpaperAnimator, MemorySink
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_MEDIA = ["cat.mp4", "emoji.mp4", "kirby.mp4", "nekoarc.mp4", "skeleton.mp4",
+                "spagheti.mp4", "evangelion.mp4", "skullspinning.gif"]
+
+# Metrics compared against a baseline: (higher is better, smallest absolute change that counts)
+COMPARED_METRICS = {
+    'preprocess.decode_fps': (True, 1.0),
+    'preprocess.resize_fps': (True, 1.0),
+    'preprocess.encode_fps': (True, 1.0),
+    'preprocess.write_fps': (True, 1.0),
+    'preprocess.pipeline_fps': (True, 1.0),
+    'load.cold_s': (False, 0.05),
+    'load.warm_s': (False, 0.005),
+    'playback.jitter_p50_ms': (False, 1.0),
+    'playback.jitter_p99_ms': (False, 2.0),
+    'peak_rss_mb': (False, 5.0),
+}
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if it can't be measured"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+        return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / 1024 / 1024
+    except (AttributeError, OSError):
+        pass
+    return None
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))]
+
+def make_animator(case, cache_dir, sink):
+    settings = case['settings']
+    return EnhancedWallpaperAnimator(
+        input_path=os.path.join(SCRIPT_DIR, case['media']),
+        target_fps=settings['fps'],
+        quality=settings['quality'],
+        scale_factor=settings['scale'],
+        enable_frame_skipping=settings['skip'],
+        workers=case.get('workers'),
+        progressive='off',
+        sink=sink,
+        cache_dir=cache_dir
+    )
+
+def measure_playback(animator, frames_data, seconds):
+    """Play frames into a memory sink and return how far each delivery was from its schedule"""
+    sink = animator.sink
+    animator.frames_complete.set()
+    animator.running = True
+    producer = threading.Thread(target=animator.frame_producer, args=(frames_data,), daemon=True)
+    consumer = threading.Thread(target=animator.frame_consumer, daemon=True)
+    producer.start()
+    consumer.start()
+    time.sleep(seconds)
+    animator.running = False
+    producer.join(timeout=2)
+    consumer.join(timeout=2)
+
+    # Deliveries follow frames_data in order, looping, so the k-th interval should last frame k's duration
+    intervals = sink.intervals()
+    durations = itertools.cycle([duration for _, duration in frames_data])
+    jitter_ms = [abs(interval - duration) * 1000 for interval, duration in zip(intervals, durations)]
+    shown_fps = len(intervals) / sum(intervals) if intervals else 0.0
+    return {
+        'frames_shown': sink.frames_shown,
+        'shown_fps': shown_fps,
+        'jitter_p50_ms': percentile(jitter_ms, 0.50),
+        'jitter_p90_ms': percentile(jitter_ms, 0.90),
+        'jitter_p99_ms': percentile(jitter_ms, 0.99),
+        'jitter_max_ms': max(jitter_ms) if jitter_ms else None,
+    }
+
+def run_case(case, play_seconds):
+    """Preprocess one media file with one setting combination, reload it from cache and play it headless"""
+    cache_dir = tempfile.mkdtemp(prefix="wubu-bench-")
+    try:
+        # Cold: nothing cached, the whole file is decoded, resized, encoded and archived
+        start_time = time.perf_counter()
+        animator = make_animator(case, cache_dir, MemorySink())
+        frames_data = animator.preprocess()
+        cold_s = time.perf_counter() - start_time
+        stats = animator.last_pipeline_stats.summary()
+        animator.cleanup()
+
+        # Warm: a fresh animator finds the cache entry and maps the archive
+        start_time = time.perf_counter()
+        animator = make_animator(case, cache_dir, MemorySink())
+        if animator.cache.lookup(animator.archive_dir) is None:
+            raise RuntimeError(f"No cache entry after preprocessing {case['media']}")
+        frames_data = animator.load_frames_from_archive()
+        warm_s = time.perf_counter() - start_time
+
+        playback = measure_playback(animator, frames_data, play_seconds)
+        frame_count = len(frames_data)
+        frames_data = None
+        animator.cleanup()
+
+        stages = stats['stages']
+        return dict(case, **{
+            'frames': frame_count,
+            'preprocess': {
+                'decode_fps': stages['decode']['fps'],
+                'resize_fps': stages['resize']['fps'],
+                'encode_fps': stages['encode']['fps'],
+                'write_fps': stages['write']['fps'],
+                'pipeline_fps': stats['fps'],
+                'workers': stats['workers'],
+            },
+            'load': {'cold_s': cold_s, 'warm_s': warm_s},
+            'playback': playback,
+            'peak_rss_mb': peak_rss_mb(),
+        })
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+class FileMemorySink(MemorySink):
+    """MemorySink fed frame files, so staging runs as it does for the Windows and command sinks"""
+    needs_file = True
+
+def run_footprint(mode, media, cache_dir, play_seconds):
+    """Start one front end on a GIF, returning time to the first frame and peak RSS.
+
+    'full' is EnhancedWallpaperAnimator with main.py's defaults, 'low' is the
+    low-footprint front end in animate_gif_wallpaper.py.
+    """
+    path = os.path.join(SCRIPT_DIR, media)
+    if mode == 'low':
+        import animate_gif_wallpaper
+        animator, _ = animate_gif_wallpaper.start(path, sink=FileMemorySink(), cache_dir=cache_dir)
+    else:
+        animator = EnhancedWallpaperAnimator(input_path=path, sink=FileMemorySink(), cache_dir=cache_dir)
+        frames_data, preprocess_thread = animator.load_frames()
+        animator.start_playback(frames_data, preprocess_thread)
+    deadline = time.perf_counter() + 60
+    while animator.first_frame_time is None and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    if animator.first_frame_time is None:
+        raise RuntimeError(f"No frame shown for {media} in {mode} mode")
+    first_frame_s = animator.first_frame_time - PROCESS_START
+    # Let processing finish so the next run finds the cache entry, and keep playing for a while
+    # so steady-state memory counts towards the peak as well
+    animator.frames_complete.wait(timeout=600)
+    time.sleep(play_seconds)
+    animator.stop()
+    animator.cleanup()
+    return {'first_frame_s': first_frame_s, 'peak_rss_mb': peak_rss_mb(), 'opencv_loaded': 'cv2' in sys.modules}
+
+def median_footprint(runs):
+    """Combine repeated runs of one phase: the median time and peak RSS, every run's values, and whether any run imported OpenCV"""
+    samples = {metric: [run[metric] for run in runs if run[metric] is not None] for metric in FOOTPRINT_MARGIN}
+    result = {metric: median(values) if values else None for metric, values in samples.items()}
+    result.update(opencv_loaded=any(run['opencv_loaded'] for run in runs), runs=len(runs), samples=samples)
+    return result
+
+def run_footprints(args, logger):
+    """Compare both front ends on every GIF in --media, cold (empty cache) and warm, each run in its own process.
+
+    Every phase is repeated --footprint-runs times, each time with a new cache,
+    and the median is kept, so neither one slow nor one lucky run decides the
+    comparison. The front ends take turns, one run each per round, so a slow
+    stretch on the machine doesn't land on only one of them.
+    """
+    results = []
+    for media in [media for media in args.media if media.lower().endswith('.gif')]:
+        runs = {mode: {'cold': [], 'warm': []} for mode in ('full', 'low')}
+        failed = set()
+        for _ in range(args.footprint_runs):
+            for mode in ('full', 'low'):
+                if mode in failed:
+                    continue
+                cache_dir = tempfile.mkdtemp(prefix="wubu-footprint-")
+                try:
+                    for phase in ('cold', 'warm'):
+                        completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-footprint', mode, media, cache_dir,
+                                                    '--play-seconds', str(args.play_seconds)],
+                                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+                        if completed.returncode != 0:
+                            raise RuntimeError(completed.stderr.strip())
+                        runs[mode][phase].append(json.loads(completed.stdout.strip().splitlines()[-1]))
+                except RuntimeError as e:
+                    logger.error(f"{media} {mode} failed:\n{e}")
+                    failed.add(mode)
+                finally:
+                    shutil.rmtree(cache_dir, ignore_errors=True)
+        for mode in ('full', 'low'):
+            if mode in failed:
+                continue
+            result = {'media': media, 'mode': mode, 'cold': median_footprint(runs[mode]['cold']),
+                      'warm': median_footprint(runs[mode]['warm'])}
+            results.append(result)
+            logger.info(f"{media} {mode}: first frame cold {result['cold']['first_frame_s'] * 1000:.0f}ms / "
+                        f"warm {result['warm']['first_frame_s'] * 1000:.0f}ms, peak RSS cold {result['cold']['peak_rss_mb'] or 0:.1f}MB / "
+                        f"warm {result['warm']['peak_rss_mb'] or 0:.1f}MB, OpenCV {'loaded' if result['cold']['opencv_loaded'] else 'not loaded'} "
+                        f"(median of {args.footprint_runs})")
+    return results
+
+# How far below the full animator the low-footprint front end has to stay cold, so run-to-run noise can't pass for a
+# saving, and the most it may come out above it warm
+FOOTPRINT_MARGIN = {'first_frame_s': 0.01, 'peak_rss_mb': 1.0}
+
+def check_footprints(results, logger):
+    """Log every measurement where the low-footprint front end isn't below the full animator, return their count.
+
+    Cold, it has to be lower by FOOTPRINT_MARGIN. Warm, both front ends play
+    the cached frames through the same code, so there it just must not come
+    out more than the margin higher.
+    """
+    by_case = {(result['media'], result['mode']): result for result in results}
+    problems = 0
+    for (media, mode), low in by_case.items():
+        full = by_case.get((media, 'full'))
+        if mode != 'low' or full is None:
+            continue
+        for phase in ('cold', 'warm'):
+            if low[phase]['opencv_loaded']:
+                problems += 1
+                logger.warning(f"{media} {phase}: the low-footprint front end imported OpenCV")
+            for metric, margin in FOOTPRINT_MARGIN.items():
+                new, reference = low[phase][metric], full[phase][metric]
+                if new is None or reference is None:
+                    continue
+                if phase == 'cold' and new > reference - margin:
+                    problems += 1
+                    logger.warning(f"{media} {phase} {metric}: low-footprint {new:.4g} is not at least {margin:g} below full {reference:.4g}")
+                elif phase == 'warm' and new > reference + margin:
+                    problems += 1
+                    logger.warning(f"{media} {phase} {metric}: low-footprint {new:.4g} is more than {margin:g} above full {reference:.4g}")
+    logger.info(f"{problems} footprint measurement(s) where the low-footprint front end is not below the full animator.")
+    return problems
+
+def case_id(case):
+    settings = case['settings']
+    return (f"{case['media']} fps={settings['fps']} q={settings['quality']} "
+            f"scale={settings['scale']} skip={'on' if settings['skip'] else 'off'}")
+
+def build_cases(args):
+    cases = []
+    for media, fps, quality, scale, skip in itertools.product(args.media, args.fps, args.quality, args.scale, args.skip):
+        cases.append({'media': media, 'workers': args.workers,
+                      'settings': {'fps': fps, 'quality': quality, 'scale': scale, 'skip': skip == 'on'}})
+    return cases
+
+def median(values):
+    """Median of a list of numbers; the statistics module isn't imported, as footprint runs count every import"""
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+def median_result(runs):
+    """Combine repeated runs of one case: every numeric value becomes the median across runs.
+
+    Each compared metric's per-run values are kept under 'samples', so
+    compare_results can tell a real change from run-to-run noise.
+    """
+    def merge(values):
+        if isinstance(values[0], dict):
+            return {key: merge([value.get(key) for value in values]) for key in values[0]}
+        if all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            return median(values)
+        return values[0]
+
+    result = merge(runs)
+    result['runs'] = len(runs)
+    result['samples'] = {}
+    for metric in COMPARED_METRICS:
+        values = [metric_value(run, metric) for run in runs]
+        if all(value is not None for value in values):
+            result['samples'][metric] = values
+    return result
+
+def run_benchmarks(args, logger):
+    """Run every case --runs times, each in its own process so peak RSS is per case, and collect the median results.
+
+    The repeats are interleaved, every case once per round, so a slow stretch on
+    the machine lands on one run of several cases rather than all runs of one.
+    """
+    cases = build_cases(args)
+    runs = {case_id(case): [] for case in cases}
+    failed = set()
+    for round_number in range(1, args.runs + 1):
+        for case in cases:
+            if case_id(case) in failed:
+                continue
+            logger.info(f"Running {case_id(case)} ({round_number}/{args.runs})...")
+            completed = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-case', json.dumps(case),
+                                        '--play-seconds', str(args.play_seconds)],
+                                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            if completed.returncode != 0:
+                logger.error(f"{case_id(case)} failed:\n{completed.stderr.strip()}")
+                failed.add(case_id(case))
+                continue
+            runs[case_id(case)].append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    results = []
+    for case in cases:
+        if case_id(case) in failed:
+            continue
+        result = median_result(runs[case_id(case)])
+        results.append(result)
+        logger.info(f"{case_id(case)}: preprocess {result['preprocess']['pipeline_fps']:.1f} fps, cold {result['load']['cold_s']:.2f}s, "
+                    f"warm {result['load']['warm_s'] * 1000:.1f}ms, jitter p99 {result['playback']['jitter_p99_ms'] or 0:.2f}ms, "
+                    f"peak RSS {result['peak_rss_mb'] or 0:.0f}MB (median of {args.runs})")
+    return {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'play_seconds': args.play_seconds,
+            'runs': args.runs,
+        },
+        'results': results,
+    }
+
+def metric_value(result, metric):
+    value = result
+    for part in metric.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+def compare_results(current, baseline, threshold, logger):
+    """Log metrics that got worse than the baseline by more than ``threshold`` (a fraction), return their count.
+
+    The medians are compared, and a change only counts once it exceeds the
+    metric's noise floor and the runs no longer overlap: every current run has
+    to be worse than every baseline run.
+    """
+    baseline_by_case = {case_id(result): result for result in baseline['results']}
+    regressions = 0
+    for result in current['results']:
+        previous = baseline_by_case.get(case_id(result))
+        if previous is None:
+            logger.info(f"{case_id(result)}: not in baseline, skipped")
+            continue
+        for metric, (higher_is_better, noise_floor) in COMPARED_METRICS.items():
+            new, old = metric_value(result, metric), metric_value(previous, metric)
+            if new is None or old is None or old == 0 or abs(new - old) < noise_floor:
+                continue
+            new_runs = result.get('samples', {}).get(metric) or [new]
+            old_runs = previous.get('samples', {}).get(metric) or [old]
+            if (max(new_runs) >= min(old_runs)) if higher_is_better else (min(new_runs) <= max(old_runs)):
+                continue
+            change = (new - old) / abs(old)
+            worse = -change if higher_is_better else change
+            if worse > threshold:
+                regressions += 1
+                logger.warning(f"REGRESSION {case_id(result)} {metric}: {old:.4g} -> {new:.4g} ({change * 100:+.1f}%)")
+    logger.info(f"{regressions} regression(s) beyond {threshold * 100:.0f}% against the baseline.")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WuBuWallPaper preprocessing and headless playback on the bundled sample media")
+    parser.add_argument('--media', nargs='+', default=SAMPLE_MEDIA, help='Media files relative to the script directory (default: all bundled samples)')
+    parser.add_argument('--fps', nargs='+', type=int, default=[15], help='Target FPS values to test (default: 15)')
+    parser.add_argument('--quality', nargs='+', type=int, default=[80], help='JPEG quality values to test (default: 80)')
+    parser.add_argument('--scale', nargs='+', type=float, default=[0.75], help='Scale factors to test (default: 0.75)')
+    parser.add_argument('--skip', nargs='+', choices=['on', 'off'], default=['on', 'off'], help='Frame skipping settings to test (default: on off)')
+    parser.add_argument('--workers', type=int, default=None, help='Resize/encode worker threads (default: CPU count)')
+    parser.add_argument('--play-seconds', type=float, default=3.0, help='Seconds of headless playback per case for jitter (default: 3)')
+    parser.add_argument('--output', default='benchmark_results.json', help='Where to write the results (default: benchmark_results.json)')
+    parser.add_argument('--compare', metavar='BASELINE', default=None, help='Compare against a saved results file and exit non-zero on regressions')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='Times each case is run, the median is compared and runs that overlap the baseline count as noise (default: 5)')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Relative change counted as a regression (default: 0.10)')
+    parser.add_argument('--footprint', action='store_true',
+                        help='Instead of the preprocessing benchmark, compare startup time and peak RSS of main.py and the '
+                             'low-footprint animate_gif_wallpaper.py on the GIFs in --media, exiting non-zero unless the latter is lower')
+    parser.add_argument('--footprint-runs', type=int, default=5,
+                        help='Times each --footprint phase is run, the median is compared (default: 5)')
+    parser.add_argument('--run-case', default=None, help=argparse.SUPPRESS)
+    parser.add_argument('--run-footprint', nargs=3, default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_footprint:
+        # Child process: start one front end and print its measurements as the last line of stdout
+        logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+        print(json.dumps(run_footprint(*args.run_footprint, args.play_seconds)))
+        return
+
+    if args.run_case:
+        # Child process: run a single case and print its result as the last line of stdout
+        logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+        print(json.dumps(run_case(json.loads(args.run_case), args.play_seconds)))
+        return
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger("benchmark")
+    if args.footprint:
+        results = {'meta': {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+                            'platform': platform.platform(), 'play_seconds': args.play_seconds,
+                            'footprint_runs': args.footprint_runs},
+                   'footprint': run_footprints(args, logger)}
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        logger.info(f"Wrote {len(results['footprint'])} footprint results to {args.output}")
+        if check_footprints(results['footprint'], logger):
+            sys.exit(1)
+        return
+
+    results = run_benchmarks(args, logger)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    logger.info(f"Wrote {len(results['results'])} results to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.threshold, logger):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,8 @@
+import time
+IMPORT_START = time.perf_counter()
 import ctypes
 import os
 import subprocess
-import time
-import cv2
-import numpy as np
-from PIL import Image
-from screeninfo import get_monitors
 import threading
 import queue
 from pathlib import Path
@@ -14,6 +11,46 @@ from io import BytesIO
 import shutil
 import sys
 import argparse
+import atexit
+import bisect
+import hashlib
+import glob
+import importlib
+import json
+import math
+import mmap
+import shlex
+import signal
+import socket
+import socketserver
+import struct
+import tempfile
+import uuid
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+LAZY_IMPORT_SECONDS = {}  # How long each deferred module took to import, by name
+
+class LazyModule:
+    """Stand-in for a heavy module that imports it on first attribute access.
+
+    OpenCV, NumPy and Pillow are only needed to decode and encode frames, so
+    playback from a cached archive starts without importing them at all.
+    """
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            start_time = time.perf_counter()
+            self._module = importlib.import_module(self._name)
+            LAZY_IMPORT_SECONDS[self._name] = time.perf_counter() - start_time
+        return getattr(self._module, attr)
+
+cv2 = LazyModule('cv2')
+np = LazyModule('numpy')
+Image = LazyModule('PIL.Image')
 
 def is_admin():
     try:
@@ -21,21 +58,1412 @@ def is_admin():
     except:
         return False
 
-if not is_admin():
-    print("Script is not running with elevated privileges. Restarting with elevation...")
-    ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
-    sys.exit()
-        
+def ensure_elevated():
+    """Restart the script with elevated privileges unless it already has them (Windows only)"""
+    if not is_admin():
+        print("Script is not running with elevated privileges. Restarting with elevation...")
+        ctypes.windll.shell32.ShellExecuteW(None, "runas", sys.executable, " ".join(sys.argv), None, 1)
+        sys.exit()
+
+VIDEO_EXTENSIONS = {'.mp4', '.avi', '.mkv', '.mov', '.wmv'}
+SEEK_GAP_FRAMES = 48  # Seek instead of grabbing when the next wanted frame is further ahead than this
+DEFAULT_GIF_DURATION_MS = 100  # Used for GIF frames without a (non-zero) delay
+
+# Resampling filters selectable with --filter, as names of the (OpenCV interpolation, Pillow filter) constants
+RESIZE_FILTERS = {
+    'nearest': ('INTER_NEAREST', 'NEAREST'),
+    'bilinear': ('INTER_LINEAR', 'BILINEAR'),
+    'bicubic': ('INTER_CUBIC', 'BICUBIC'),
+    'lanczos': ('INTER_LANCZOS4', 'LANCZOS'),
+}
+DEFAULT_VIDEO_FILTER = 'bilinear'
+DEFAULT_GIF_FILTER = 'lanczos'
+
+# Frame file formats selectable with --format, as (extension, OpenCV params, Pillow format, Pillow params) by quality
+FRAME_FORMATS = {
+    'jpeg': ('.jpg', lambda quality: [cv2.IMWRITE_JPEG_QUALITY, quality], 'JPEG', lambda quality: {'quality': quality}),
+    'bmp': ('.bmp', lambda quality: [], 'BMP', lambda quality: {}),
+    'png': ('.png', lambda quality: [cv2.IMWRITE_PNG_COMPRESSION, 3], 'PNG', lambda quality: {'compress_level': 3}),
+    'webp': ('.webp', lambda quality: [cv2.IMWRITE_WEBP_QUALITY, quality], 'WEBP', lambda quality: {'quality': quality}),
+}
+AUTO_FORMAT_SAMPLES = 5  # Frames tried with every format by --format auto
+
+# Keyframe + delta frame store (--frame-store delta)
+DELTA_TILE = 32  # Tile edge in pixels, a multiple of the 16-pixel JPEG block so tiles don't bleed into each other
+DELTA_KEYFRAME_INTERVAL = 60  # Frames between forced keyframes, bounding the work to reconstruct any one frame
+DELTA_KEYFRAME_CHANGE = 0.5  # Store a keyframe instead when more than this share of tiles changed
+DELTA_THRESHOLD = 2.0  # Mean absolute difference (0-255) above which a tile counts as changed
+DELTA_READ_AHEAD = 4  # Reconstructed frames kept ready ahead of playback
+DELTA_FRAME_CACHE = 3  # Reconstructed frames kept to rebuild the next ones from
+DELTA_CHECK_FRAMES = 60  # Frames timed before reconstruction cost is checked against the frame budget
+
+def resize_filter_constants(name):
+    """The (OpenCV interpolation, Pillow filter) pair for a --filter name"""
+    interpolation, resample = RESIZE_FILTERS[name]
+    return getattr(cv2, interpolation), getattr(Image, resample)
+
+def frame_format_supported(name):
+    """Whether both OpenCV and Pillow can write a frame format in this build"""
+    extension, _, pil_format, _ = FRAME_FORMATS[name]
+    Image.init()
+    return cv2.haveImageWriter(extension) and pil_format in Image.SAVE
+
+PERCEPTUAL_HASH_SIZE = 16  # Difference hash over a 17x16 grayscale thumbnail, 256 bits
+
+def perceptual_hash(frame):
+    """Difference hash of a BGR ndarray or Pillow image, as packed bits"""
+    size = PERCEPTUAL_HASH_SIZE
+    if isinstance(frame, np.ndarray):
+        thumbnail = cv2.cvtColor(cv2.resize(frame, (size + 1, size), interpolation=cv2.INTER_AREA), cv2.COLOR_BGR2GRAY)
+    else:
+        thumbnail = np.asarray(frame.resize((size + 1, size), Image.BOX).convert('L'))
+    return np.packbits(thumbnail[:, 1:] > thumbnail[:, :-1])
+
+def hash_distance(hash_a, hash_b):
+    """Number of differing bits between two perceptual hashes"""
+    return int(np.count_nonzero(np.unpackbits(hash_a ^ hash_b)))
+
+HEADLESS_MONITOR_SIZE = (1920, 1080)  # Assumed when there is no display
+
+def detect_monitors():
+    """Monitors attached to the desktop, or a single 1080p stand-in when there is no display (headless runs)"""
+    from screeninfo import get_monitors, Monitor, ScreenInfoError
+    try:
+        return get_monitors()
+    except ScreenInfoError:
+        width, height = HEADLESS_MONITOR_SIZE
+        logging.getLogger(__name__).warning(f"No display found, assuming one {width}x{height} monitor.")
+        return [Monitor(x=0, y=0, width=width, height=height, is_primary=True)]
+
+MonitorRect = namedtuple('MonitorRect', 'x y width height')
+
+def detect_monitors_native():
+    """Monitors asked from the OS without loading screeninfo, or None where only screeninfo can tell.
+
+    On Windows this makes the same EnumDisplayMonitors call, with the same DPI
+    awareness, as screeninfo, so the rectangles and cache keys match
+    detect_monitors(). A session with neither DISPLAY nor WAYLAND_DISPLAY has
+    no desktop to probe and gets the headless stand-in directly.
+    """
+    if sys.platform == 'win32':
+        from ctypes import wintypes
+        rects = []
+
+        def callback(monitor, dc, rect, data):
+            r = rect.contents
+            rects.append(MonitorRect(r.left, r.top, r.right - r.left, r.bottom - r.top))
+            return 1
+
+        monitor_enum_proc = ctypes.WINFUNCTYPE(ctypes.c_int, ctypes.c_ulong, ctypes.c_ulong, ctypes.POINTER(wintypes.RECT), ctypes.c_double)
+        try:
+            ctypes.windll.shcore.SetProcessDpiAwareness(2)  # Per-monitor aware, as screeninfo sets it
+        except (AttributeError, OSError):
+            return None
+        ctypes.windll.user32.EnumDisplayMonitors(None, None, monitor_enum_proc(callback), 0)
+        return rects or None
+    if sys.platform.startswith('linux') and not os.environ.get('DISPLAY') and not os.environ.get('WAYLAND_DISPLAY'):
+        width, height = HEADLESS_MONITOR_SIZE
+        logging.getLogger(__name__).warning(f"No display found, assuming one {width}x{height} monitor.")
+        return [MonitorRect(0, 0, width, height)]
+    return None
+
+class MonitorLayout:
+    """Per-monitor placement of frames on one spanned wallpaper canvas.
+
+    The canvas covers the bounding box of all monitors (times the scale
+    factor). For every monitor the part of the source it actually shows is
+    worked out once, and each frame is composed by resizing just that part to
+    the monitor's size and placing it on a preallocated canvas. In 'fit' mode
+    each monitor shows the whole source letterboxed, in 'fill' mode the
+    source is cropped to cover each monitor, and in 'span' mode one image
+    covers the whole desktop with each monitor showing its own slice.
+    """
+    MODES = ('fit', 'fill', 'span')
+
+    def __init__(self, monitors, mode, scale_factor, source_size):
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown layout mode {mode!r}")
+        self.mode = mode
+        source_width, source_height = source_size
+        left = min(m.x for m in monitors)
+        top = min(m.y for m in monitors)
+        self.canvas_size = (max(1, round((max(m.x + m.width for m in monitors) - left) * scale_factor)),
+                            max(1, round((max(m.y + m.height for m in monitors) - top) * scale_factor)))
+        canvas_width, canvas_height = self.canvas_size
+
+        # One image covering the whole canvas, centred, for 'span'
+        span_scale = max(canvas_width / source_width, canvas_height / source_height)
+        span_x = (canvas_width - source_width * span_scale) / 2
+        span_y = (canvas_height - source_height * span_scale) / 2
+
+        # (source crop x0, y0, x1, y1, canvas x, y, width, height) per monitor
+        self.placements = []
+        for m in monitors:
+            x, y = round((m.x - left) * scale_factor), round((m.y - top) * scale_factor)
+            width = max(1, min(round(m.width * scale_factor), canvas_width - x))
+            height = max(1, min(round(m.height * scale_factor), canvas_height - y))
+            if mode == 'fit':
+                fit_scale = min(width / source_width, height / source_height)
+                fit_width = max(1, round(source_width * fit_scale))
+                fit_height = max(1, round(source_height * fit_scale))
+                crop = (0, 0, source_width, source_height)
+                x, y = x + (width - fit_width) // 2, y + (height - fit_height) // 2
+                width, height = fit_width, fit_height
+            elif mode == 'fill':
+                fill_scale = max(width / source_width, height / source_height)
+                crop_width, crop_height = width / fill_scale, height / fill_scale
+                crop_x, crop_y = (source_width - crop_width) / 2, (source_height - crop_height) / 2
+                crop = (crop_x, crop_y, crop_x + crop_width, crop_y + crop_height)
+            else:
+                crop = ((x - span_x) / span_scale, (y - span_y) / span_scale,
+                        (x + width - span_x) / span_scale, (y + height - span_y) / span_scale)
+            x0, y0 = max(0, int(crop[0])), max(0, int(crop[1]))
+            x1, y1 = min(source_width, max(x0 + 1, round(crop[2]))), min(source_height, max(y0 + 1, round(crop[3])))
+            self.placements.append((x0, y0, x1, y1, x, y, width, height))
+        self.local = threading.local()
+
+    def describe(self):
+        """The layout as plain data, for cache keys and logs"""
+        return {'mode': self.mode, 'canvas': list(self.canvas_size), 'placements': [list(p) for p in self.placements]}
+
+    def visible_pixels(self):
+        return sum(width * height for _, _, _, _, _, _, width, height in self.placements)
+
+    def compose(self, frame, interpolation):
+        """Render an HxWxC frame array onto this thread's canvas and return the canvas.
+
+        The canvas is reused for the next frame on the same thread, so it has
+        to be encoded before compose is called again.
+        """
+        canvas = getattr(self.local, 'canvas', None)
+        if canvas is None or canvas.shape[2:] != frame.shape[2:] or canvas.dtype != frame.dtype:
+            # Areas no monitor shows stay black; every frame overwrites the same regions
+            canvas = self.local.canvas = np.zeros((self.canvas_size[1], self.canvas_size[0]) + frame.shape[2:], dtype=frame.dtype)
+        for x0, y0, x1, y1, x, y, width, height in self.placements:
+            canvas[y:y + height, x:x + width] = cv2.resize(frame[y0:y1, x0:x1], (width, height), interpolation=interpolation)
+        return canvas
+
+class WallpaperSink:
+    """Destination that frame_consumer delivers frames to"""
+    name = None
+    needs_file = True  # Whether frames must be written to an image file before delivery
+
+    def set_frame(self, image_path=None, frame_bytes=None):
+        """Show one frame, given as a file path or (when needs_file is False) as encoded bytes"""
+        raise NotImplementedError
+
+    def span_monitors(self):
+        """Ask the desktop to stretch one image across all monitors, for composed multi-monitor frames"""
+        pass
+
+    def unspan_monitors(self):
+        """Put back the desktop settings span_monitors replaced"""
+        pass
+
+    def close(self):
+        pass
+
+class WindowsSpiSink(WallpaperSink):
+    """Set the desktop wallpaper with SystemParametersInfoW"""
+    name = 'windows'
+    SPI_SETDESKWALLPAPER = 20
+    SPAN_STYLE = {"WallpaperStyle": "22", "TileWallpaper": "0"}
+
+    def __init__(self):
+        self.saved_style = None  # Registry values span_monitors replaced, None for values that were missing
+
+    def set_frame(self, image_path=None, frame_bytes=None):
+        return ctypes.windll.user32.SystemParametersInfoW(self.SPI_SETDESKWALLPAPER, 0, image_path, 2)
+
+    def span_monitors(self):
+        if self.saved_style is not None:
+            return  # Already spanned, e.g. by an earlier daemon item sharing this sink
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Control Panel\Desktop", 0, winreg.KEY_QUERY_VALUE | winreg.KEY_SET_VALUE) as key:
+            saved = {}
+            for name, value in self.SPAN_STYLE.items():
+                try:
+                    saved[name] = winreg.QueryValueEx(key, name)
+                except FileNotFoundError:
+                    saved[name] = None
+                winreg.SetValueEx(key, name, 0, winreg.REG_SZ, value)
+            self.saved_style = saved
+
+    def unspan_monitors(self):
+        if self.saved_style is None:
+            return
+        import winreg
+        with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Control Panel\Desktop", 0, winreg.KEY_SET_VALUE) as key:
+            for name, saved in self.saved_style.items():
+                if saved is None:
+                    winreg.DeleteValue(key, name)
+                else:
+                    winreg.SetValueEx(key, name, 0, saved[1], saved[0])
+        self.saved_style = None
+
+    def close(self):
+        try:
+            self.unspan_monitors()
+        except OSError as e:
+            logging.getLogger(__name__).error(f"Could not restore the wallpaper style: {e}")
+
+class CommandSink(WallpaperSink):
+    """Run an external wallpaper setter (feh, xwallpaper, ...) for every frame.
+
+    ``{path}`` in the command is replaced with the frame file; if it is
+    missing, the path is appended as the last argument.
+    """
+    name = 'command'
+    DEFAULT_COMMAND = "feh --no-fehbg --bg-fill {path}"
+
+    def __init__(self, command=None):
+        self.command = shlex.split(command or self.DEFAULT_COMMAND)
+        if not any('{path}' in arg for arg in self.command):
+            self.command.append('{path}')
+
+    def set_frame(self, image_path=None, frame_bytes=None):
+        result = subprocess.run([arg.replace('{path}', image_path) for arg in self.command],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return result.returncode == 0
+
+class MemorySink(WallpaperSink):
+    """Keep the latest frame in memory and record delivery times, for headless profiling and load tests"""
+    name = 'memory'
+    needs_file = False
+
+    def __init__(self, history=100000):
+        self.frame = None
+        self.frames_shown = 0
+        self.bytes_shown = 0
+        self.timestamps = deque(maxlen=history)  # perf_counter() of each delivery
+
+    def set_frame(self, image_path=None, frame_bytes=None):
+        if frame_bytes is None:
+            with open(image_path, 'rb') as f:
+                frame_bytes = f.read()
+        self.frame = frame_bytes
+        self.frames_shown += 1
+        self.bytes_shown += len(frame_bytes)
+        self.timestamps.append(time.perf_counter())
+        return True
+
+    def intervals(self):
+        """Seconds between consecutive deliveries"""
+        stamps = list(self.timestamps)
+        return [later - earlier for earlier, later in zip(stamps, stamps[1:])]
+
+WALLPAPER_SINKS = {sink.name: sink for sink in (WindowsSpiSink, CommandSink, MemorySink)}
+
+def create_sink(name=None, command=None):
+    """Build a sink by name; without one, use Windows on win32, otherwise a command if given or memory"""
+    if name is None:
+        name = 'windows' if sys.platform == 'win32' else ('command' if command else 'memory')
+    if name == 'command':
+        return CommandSink(command)
+    return WALLPAPER_SINKS[name]()
+
+def process_alive(pid):
+    """Whether a process with this id is still running"""
+    if sys.platform == 'win32':
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class StagingFull(Exception):
+    """Writing a file would take staging storage over its byte budget"""
+
+class StagingStorage:
+    """Fast storage for the frame files that file-based sinks read, with a byte budget.
+
+    Every process works in its own ``wubu-<pid>`` directory under the
+    backend's root, so opening storage can remove the directories of runs
+    that crashed without cleaning up. Bytes written through ``write`` are
+    counted against the budget (and the free space on the root), and a write
+    that would go over it raises StagingFull. This base class is the plain
+    directory backend; the others differ in where the root is and how it
+    comes to exist.
+    """
+    name = 'dir'
+    PREFIX = "wubu-"
+
+    def __init__(self, root, budget_bytes, logger):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.logger = logger
+        self.directory = os.path.join(root, f"{self.PREFIX}{os.getpid()}")
+        self.sizes = {}  # Bytes of every file written, by path
+        self.used_bytes = 0
+        self.lock = threading.Lock()
+        self.closed = True
+
+    @staticmethod
+    def default_root():
+        return tempfile.gettempdir()
+
+    def setup(self):
+        """Make the root usable, returning False if this backend can't be used here"""
+        os.makedirs(self.root, exist_ok=True)
+        return True
+
+    def teardown(self):
+        pass
+
+    def open(self):
+        try:
+            if not self.setup():
+                return False
+            self.sweep()
+            os.makedirs(self.directory, exist_ok=True)
+            free_bytes = shutil.disk_usage(self.root).free
+        except OSError as e:
+            self.logger.warning(f"Staging backend {self.name} at {self.root} is not usable: {e}")
+            return False
+        if free_bytes < self.budget_bytes:
+            self.logger.warning(f"Only {free_bytes / 1024 / 1024:.0f}MB free at {self.root}, lowering the staging budget to match.")
+            self.budget_bytes = free_bytes
+        self.closed = False
+        atexit.register(self.close)
+        return True
+
+    def sweep(self):
+        """Remove staging directories left behind by processes that are no longer running"""
+        for entry in os.listdir(self.root):
+            pid = entry[len(self.PREFIX):]
+            if entry.startswith(self.PREFIX) and pid.isdigit() and int(pid) != os.getpid() and not process_alive(int(pid)):
+                shutil.rmtree(os.path.join(self.root, entry), ignore_errors=True)
+                self.logger.info(f"Removed staging files of crashed run {pid} from {self.root}")
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def fits(self, extra_bytes):
+        return self.used_bytes + extra_bytes <= self.budget_bytes
+
+    def write(self, name, data):
+        """Write (or replace) a file, returning its path"""
+        path = self.path(name)
+        with self.lock:
+            used_bytes = self.used_bytes - self.sizes.get(path, 0) + len(data)
+            if used_bytes > self.budget_bytes:
+                raise StagingFull(f"{name} would take staging to {used_bytes / 1024 / 1024:.1f}MB of {self.budget_bytes / 1024 / 1024:.0f}MB")
+            self.used_bytes = used_bytes
+            self.sizes[path] = len(data)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def remove(self, name):
+        """Remove a file or directory written through this storage"""
+        path = self.path(name)
+        with self.lock:
+            for written in [written for written in self.sizes if written == path or written.startswith(path + os.sep)]:
+                self.used_bytes -= self.sizes.pop(written)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.sizes.clear()
+        self.used_bytes = 0
+        self.teardown()
+        atexit.unregister(self.close)
+
+class TmpfsStorage(StagingStorage):
+    """Memory-backed tmpfs such as /dev/shm"""
+    name = 'tmpfs'
+
+    @staticmethod
+    def default_root():
+        return "/dev/shm"
+
+    def setup(self):
+        return os.path.isdir(self.root)
+
+class RamDiskStorage(StagingStorage):
+    """A RAM disk that is already mounted, e.g. one kept around by ImDisk or another tool"""
+    name = 'ramdisk'
+
+    @staticmethod
+    def default_root():
+        return "R:\\"
+
+    def setup(self):
+        return os.path.isdir(self.root)
+
+class ImDiskStorage(RamDiskStorage):
+    """A RAM disk created with ImDisk for as long as the storage is open (Windows)"""
+    name = 'imdisk'
+    FILESYSTEM_HEADROOM_MB = 16  # NTFS metadata on top of the staging budget
+
+    def setup(self):
+        self.created = False
+        if os.path.isdir(self.root):
+            self.logger.info(f"RAM disk at {self.root} already exists. Skipping creation.")
+            return True
+        if shutil.which("imdisk") is None:
+            return False
+        size_mb = self.budget_bytes // (1024 * 1024) + self.FILESYSTEM_HEADROOM_MB
+        self.logger.info(f"Creating a RAM disk of size {size_mb}MB at {self.root}...")
+        try:
+            subprocess.run(["imdisk", "-a", "-s", f"{size_mb}M", "-m", self.root.rstrip("\\"), "-p", "/fs:ntfs /q /y"], check=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            self.logger.error(f"Failed to create RAM disk: {e}")
+            return False
+        self.created = True
+        return True
+
+    def teardown(self):
+        if not self.created:
+            return
+        self.logger.info(f"Removing RAM disk at {self.root}...")
+        try:
+            subprocess.run(["imdisk", "-D", "-m", self.root.rstrip("\\")], check=True)
+        except (subprocess.CalledProcessError, OSError) as e:
+            self.logger.error(f"Failed to remove RAM disk: {e}")
+
+STAGING_BACKENDS = {storage.name: storage for storage in (RamDiskStorage, ImDiskStorage, TmpfsStorage, StagingStorage)}
+
+def create_staging(name=None, root=None, budget_mb=512, logger=None):
+    """Open staging storage with the named backend, or the first that works here, falling back to a plain directory.
+
+    ``root`` only applies to the backends tried before that fallback, which
+    always uses the default temp directory, so a missing drive never stops playback.
+    """
+    logger = logger or logging.getLogger(__name__)
+    if name is not None:
+        candidates = [name]
+    elif sys.platform == 'win32':
+        candidates = ['ramdisk', 'imdisk', 'dir']
+    else:
+        candidates = ['tmpfs', 'dir']
+    attempts = [(candidate, root) for candidate in candidates]
+    if root is not None or candidates[-1] != 'dir':
+        attempts.append(('dir', None))
+    for candidate, candidate_root in attempts:
+        backend = STAGING_BACKENDS[candidate]
+        storage = backend(candidate_root or backend.default_root(), budget_mb * 1024 * 1024, logger)
+        if storage.open():
+            logger.info(f"Staging frames in {storage.directory} ({storage.name}, {storage.budget_bytes / 1024 / 1024:.0f}MB budget)")
+            return storage
+        logger.info(f"Staging backend {candidate} is not available at {storage.root}.")
+    raise RuntimeError("No usable staging storage")
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram in seconds, cheap enough to update on every frame"""
+    BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1)  # Last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the given quantile, capped at the largest observed value"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.BUCKETS, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum_s': self.sum,
+            'mean_s': self.sum / self.count if self.count else None,
+            'max_s': self.max,
+            'p50_s': self.quantile(0.5),
+            'p90_s': self.quantile(0.9),
+            'p99_s': self.quantile(0.99),
+            'buckets': {str(bound): bucket_count for bound, bucket_count in zip(self.BUCKETS + ('+Inf',), self.counts)},
+        }
+
+    def prometheus_lines(self, name, help_text):
+        lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        cumulative = 0
+        for bound, bucket_count in zip(self.BUCKETS + ('+Inf',), self.counts):
+            cumulative += bucket_count
+            lines.append(f'{name}_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"{name}_sum {self.sum}")
+        lines.append(f"{name}_count {self.count}")
+        return lines
+
+class StartupTimer:
+    """Time the steps from creating an animator to its first frame, to keep time-to-first-frame low"""
+    def __init__(self):
+        self.start_time = self.last_time = time.perf_counter()
+        self.steps = []
+
+    def mark(self, step):
+        """Record the time since the previous mark as ``step``"""
+        now = time.perf_counter()
+        self.steps.append((step, now - self.last_time))
+        self.last_time = now
+
+    def breakdown(self):
+        """Step durations in ms, starting with importing this module and any deferred libraries loaded so far"""
+        steps = [('import', IMPORT_END - IMPORT_START)] + self.steps
+        steps += [(f"import {name}", seconds) for name, seconds in LAZY_IMPORT_SECONDS.items()]
+        return {step: round(seconds * 1000, 1) for step, seconds in steps}
+
+    def summary(self):
+        breakdown = self.breakdown()
+        libraries = "" if LAZY_IMPORT_SECONDS else ", decode libraries not loaded"
+        return (", ".join(f"{step} {ms:.0f} ms" for step, ms in breakdown.items())
+                + f"; {(self.last_time - self.start_time) * 1000:.0f} ms since the animator was created{libraries}")
+
+class PlaybackMetrics:
+    """Counters, gauges and latency histograms for the playback loop.
+
+    Updated from the producer and consumer threads without locking (single
+    writer per field) and exported as a JSON snapshot or in the Prometheus
+    text format. The animator only creates one when a metrics file is set.
+    """
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.frame_write_latency = LatencyHistogram()
+        self.set_wallpaper_latency = LatencyHistogram()
+        self.frames_shown = 0
+        self.deadline_misses = 0
+        self.drift = 0.0  # How late the latest frame was shown relative to its schedule
+        self.max_drift = 0.0
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.queue_full = 0
+        self.frames_dropped = 0  # Frames skipped because their slot had already passed
+        self.reanchors = 0  # Times the schedule was reset to wall time
+        self.stride = 1  # Frames advanced per update by the adaptive controller
+        self.startup_ms = None  # StartupTimer breakdown, once the first frame is shown
+        self.recent_frames = deque(maxlen=64)  # perf_counter() of recent deliveries, for the current FPS
+
+    def frame_shown(self, shown_time, scheduled_time, queue_depth):
+        self.frames_shown += 1
+        self.recent_frames.append(shown_time)
+        self.drift = shown_time - scheduled_time
+        if self.drift > self.max_drift:
+            self.max_drift = self.drift
+        self.queue_depth = queue_depth
+        if queue_depth > self.max_queue_depth:
+            self.max_queue_depth = queue_depth
+
+    def displayed_fps(self):
+        """Frames shown per second over the recent window"""
+        recent = list(self.recent_frames)
+        if len(recent) < 2 or recent[-1] <= recent[0]:
+            return 0.0
+        return (len(recent) - 1) / (recent[-1] - recent[0])
+
+    def snapshot(self):
+        return {
+            'uptime_s': time.perf_counter() - self.start_time,
+            'frames_shown': self.frames_shown,
+            'displayed_fps': self.displayed_fps(),
+            'deadline_misses': self.deadline_misses,
+            'drift_s': self.drift,
+            'max_drift_s': self.max_drift,
+            'queue_depth': self.queue_depth,
+            'max_queue_depth': self.max_queue_depth,
+            'queue_full': self.queue_full,
+            'frames_dropped': self.frames_dropped,
+            'reanchors': self.reanchors,
+            'stride': self.stride,
+            'startup_ms': self.startup_ms,
+            'frame_write_latency': self.frame_write_latency.snapshot(),
+            'set_wallpaper_latency': self.set_wallpaper_latency.snapshot(),
+        }
+
+    def to_prometheus(self):
+        lines = []
+        for name, kind, value, help_text in (
+                ('wubu_frames_shown_total', 'counter', self.frames_shown, 'Frames delivered to the wallpaper sink'),
+                ('wubu_deadline_misses_total', 'counter', self.deadline_misses, 'Frames whose slot had passed before they could be shown'),
+                ('wubu_frame_queue_full_total', 'counter', self.queue_full, 'Frames the producer dropped because the queue was full'),
+                ('wubu_frames_dropped_total', 'counter', self.frames_dropped, 'Late frames skipped by the scheduler'),
+                ('wubu_schedule_reanchors_total', 'counter', self.reanchors, 'Times the schedule was reset to wall time'),
+                ('wubu_frame_stride', 'gauge', self.stride, 'Frames advanced per wallpaper update'),
+                ('wubu_displayed_fps', 'gauge', self.displayed_fps(), 'Frames shown per second over the recent window'),
+                ('wubu_schedule_drift_seconds', 'gauge', self.drift, 'How late the latest frame was shown'),
+                ('wubu_schedule_drift_max_seconds', 'gauge', self.max_drift, 'Largest lateness seen so far'),
+                ('wubu_frame_queue_depth', 'gauge', self.queue_depth, 'Frames waiting in the queue'),
+                ('wubu_frame_queue_depth_max', 'gauge', self.max_queue_depth, 'Largest queue depth seen so far')):
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {value}"]
+        lines += self.frame_write_latency.prometheus_lines('wubu_frame_write_seconds', 'Time to write a frame to its staging file')
+        lines += self.set_wallpaper_latency.prometheus_lines('wubu_set_wallpaper_seconds', 'Time spent in the wallpaper sink per frame')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Atomically rewrite the metrics file: Prometheus text for *.prom, JSON otherwise"""
+        content = self.to_prometheus() if path.endswith('.prom') else json.dumps(self.snapshot(), indent=2)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+class FrameRateController:
+    """Adapt how many frames each wallpaper update advances, based on the sink's latency.
+
+    ``budget`` is the set-wallpaper latency allowed per source frame, so an
+    update that advances N frames may take N times as long. An exponentially
+    weighted average of the latency is kept; when it stays over the current
+    stride's budget for ``window`` updates, the stride grows (every Nth frame
+    is shown, the skipped frames' time stays on the previous one), and when it
+    stays comfortably within the next lower stride's budget, it shrinks again.
+    """
+    def __init__(self, budget, window, max_stride=8, smoothing=0.2):
+        self.budget = budget
+        self.window = window
+        self.max_stride = max_stride
+        self.smoothing = smoothing
+        self.stride = 1
+        self.average = None
+        self.over_budget = 0
+        self.under_budget = 0
+
+    def observe(self, latency):
+        """Record one update's latency and return the stride to use from now on"""
+        self.average = latency if self.average is None else self.average + self.smoothing * (latency - self.average)
+        if self.average > self.budget * self.stride:
+            self.over_budget += 1
+            self.under_budget = 0
+        elif self.average < self.budget * (self.stride - 1) * 0.75:
+            self.under_budget += 1
+            self.over_budget = 0
+        else:
+            self.over_budget = self.under_budget = 0
+
+        if self.over_budget >= self.window and self.stride < self.max_stride:
+            self.stride += 1
+            self.over_budget = 0
+        elif self.under_budget >= self.window and self.stride > 1:
+            self.stride -= 1
+            self.under_budget = 0
+        return self.stride
+
+class PipelineStats:
+    """Accumulate busy time and frame counts for each preprocessing stage"""
+    def __init__(self, stages, workers=1):
+        self.stages = stages
+        self.workers = workers
+        self.busy = {stage: 0.0 for stage in stages}
+        self.frames = {stage: 0 for stage in stages}
+        self.lock = threading.Lock()
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    def add(self, stage, seconds, frames=1):
+        """Record time spent by one stage on the given number of frames"""
+        with self.lock:
+            self.busy[stage] += seconds
+            self.frames[stage] += frames
+
+    def finish(self):
+        self.end_time = time.perf_counter()
+
+    def throughput(self):
+        """Frames per second of busy time for each stage (per worker for pooled stages)"""
+        return {stage: (self.frames[stage] / self.busy[stage] if self.busy[stage] > 0 else 0.0)
+                for stage in self.stages}
+
+    def summary(self):
+        """Per-stage frames, busy seconds and frames per second, plus the overall wall-clock rate"""
+        elapsed = (self.end_time or time.perf_counter()) - self.start_time
+        rates = self.throughput()
+        frames_out = self.frames[self.stages[-1]]
+        return {
+            'stages': {stage: {'frames': self.frames[stage], 'busy_s': self.busy[stage], 'fps': rates[stage]}
+                       for stage in self.stages},
+            'workers': self.workers,
+            'elapsed_s': elapsed,
+            'fps': frames_out / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def log_summary(self, logger, pooled_stages=()):
+        """Log per-stage throughput and name the slowest stage"""
+        elapsed = (self.end_time or time.perf_counter()) - self.start_time
+        rates = self.throughput()
+        capacity = {}
+        for stage in self.stages:
+            parallelism = self.workers if stage in pooled_stages else 1
+            capacity[stage] = rates[stage] * parallelism
+            logger.info(f"Stage {stage}: {self.frames[stage]} frames, {self.busy[stage]:.2f}s busy, "
+                        f"{rates[stage]:.1f} fps x {parallelism} thread(s) = {capacity[stage]:.1f} fps")
+        frames_out = self.frames[self.stages[-1]]
+        overall = frames_out / elapsed if elapsed > 0 else 0.0
+        active = {stage: fps for stage, fps in capacity.items() if fps > 0}
+        bottleneck = min(active, key=active.get) if active else "n/a"
+        logger.info(f"Pipeline: {frames_out} frames in {elapsed:.2f}s ({overall:.1f} fps), bottleneck: {bottleneck}")
+
+class FrameCache:
+    """Content-addressed store of preprocessed frame archives.
+
+    Every entry lives in its own directory named after the source file and a
+    hash of the source content plus all processing parameters, so changing the
+    file or any setting yields a different entry instead of stale frames.
+    Entries are built in a hidden temporary directory and renamed into place
+    with their manifest once complete; only directories with a manifest are
+    treated as valid. The least recently used entries are evicted when the
+    cache grows beyond its disk budget.
+    """
+    MANIFEST = "manifest.json"
+    SOURCES = "sources.json"
+    VERSION = 4
+    STALE_BUILD_SECONDS = 600  # Build directories untouched for this long belong to a crashed run
+
+    def __init__(self, root, max_size_mb, logger):
+        self.root = root
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+        self.logger = logger
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def _read_json(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write_json(path, data):
+        """Write JSON next to its destination and atomically move it into place"""
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def source_digest(self, path):
+        """Hash the source file content, reusing the last hash while size and mtime are unchanged"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        sources_path = os.path.join(self.root, self.SOURCES)
+        sources = self._read_json(sources_path) or {}
+        known = sources.get(path)
+        if known and known.get('size') == stat.st_size and known.get('mtime_ns') == stat.st_mtime_ns:
+            return known['digest']
+
+        digest = hashlib.blake2b(digest_size=20)
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        sources[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'digest': digest.hexdigest()}
+        try:
+            self._write_json(sources_path, sources)
+        except OSError as e:
+            self.logger.warning(f"Could not record source hash: {e}")
+        return sources[path]['digest']
+
+    def make_key(self, source_digest, params):
+        """Combine the source hash and processing parameters into a cache key"""
+        identity = json.dumps({'version': self.VERSION, 'source': source_digest, 'params': params}, sort_keys=True)
+        return hashlib.blake2b(identity.encode('utf-8'), digest_size=8).hexdigest()
+
+    def entry_dir(self, name, key):
+        return os.path.join(self.root, f"{name}-{key}")
+
+    def lookup(self, entry_dir):
+        """Return the manifest of a complete entry and mark it as recently used, or None"""
+        manifest_path = os.path.join(entry_dir, self.MANIFEST)
+        manifest = self._read_json(manifest_path)
+        if not manifest or not manifest.get('complete'):
+            return None
+        manifest['last_used'] = time.time()
+        try:
+            self._write_json(manifest_path, manifest)
+        except OSError as e:
+            self.logger.warning(f"Could not update cache entry {entry_dir}: {e}")
+        return manifest
+
+    def build_dir(self, entry_dir):
+        """A new build directory path for an entry, unique to one build even within a process"""
+        return os.path.join(self.root, f".build-{os.path.basename(entry_dir)}-{os.getpid()}-{uuid.uuid4().hex[:8]}")
+
+    def begin(self, entry_dir):
+        """Create a private build directory for an entry"""
+        build_dir = self.build_dir(entry_dir)
+        os.makedirs(build_dir)
+        return build_dir
+
+    def publish(self, build_dir, entry_dir, manifest):
+        """Write the manifest and atomically move a finished build into place"""
+        manifest = dict(manifest, complete=True, created=time.time(), last_used=time.time(),
+                        bytes=self._dir_size(build_dir))
+        self._write_json(os.path.join(build_dir, self.MANIFEST), manifest)
+        if self._complete(entry_dir):
+            # Another run finished the same entry first; both are equivalent
+            shutil.rmtree(build_dir, ignore_errors=True)
+        else:
+            if os.path.exists(entry_dir):
+                # Left over from an eviction that couldn't remove every file, never a finished entry
+                self.logger.info(f"Replacing incomplete cache entry {entry_dir}")
+                shutil.rmtree(entry_dir, ignore_errors=True)
+            os.replace(build_dir, entry_dir)
+        self.logger.info(f"Published {manifest.get('frame_count', 0)} frames ({manifest['bytes'] / 1024 / 1024:.1f}MB) to cache entry {entry_dir}")
+        return entry_dir
+
+    def discard(self, build_dir):
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+    def _complete(self, entry_dir):
+        manifest = self._read_json(os.path.join(entry_dir, self.MANIFEST))
+        return bool(manifest and manifest.get('complete'))
+
+    @staticmethod
+    def is_entry_name(name):
+        """Whether a directory name has the <name>-<key> form of cache entries (legacy frame directories don't)"""
+        key = name.rpartition('-')[2]
+        return not name.startswith('.') and len(key) == 16 and all(c in '0123456789abcdef' for c in key)
+
+    @staticmethod
+    def _dir_size(path):
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+    def entries(self, sweep=False):
+        """List (entry_dir, manifest) for every complete entry; with ``sweep``, remove entry directories without a manifest"""
+        found = []
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and not entry.name.startswith('.'):
+                manifest = self._read_json(os.path.join(entry.path, self.MANIFEST))
+                if manifest and manifest.get('complete'):
+                    found.append((entry.path, manifest))
+                elif sweep and self.is_entry_name(entry.name):
+                    # Entries are moved into place with their manifest, so this is what a failed removal left behind
+                    self.logger.info(f"Removing incomplete cache entry {entry.path}")
+                    shutil.rmtree(entry.path, ignore_errors=True)
+        return found
+
+    def evict(self, keep=()):
+        """Remove abandoned builds and least recently used entries beyond the disk budget"""
+        now = time.time()
+        for entry in os.scandir(self.root):
+            if entry.is_dir() and entry.name.startswith('.build-'):
+                try:
+                    mtimes = [entry.stat().st_mtime] + [f.stat().st_mtime for f in os.scandir(entry.path)]
+                except FileNotFoundError:
+                    continue  # Published or discarded by another job while scanning
+                if now - max(mtimes) > self.STALE_BUILD_SECONDS:
+                    self.logger.info(f"Removing abandoned cache build {entry.path}")
+                    shutil.rmtree(entry.path, ignore_errors=True)
+
+        keep = {os.path.abspath(path) for path in keep}
+        entries = sorted(self.entries(sweep=True), key=lambda item: item[1].get('last_used', 0))
+        total = sum(manifest.get('bytes', 0) for _, manifest in entries)
+        for path, manifest in entries:
+            if total <= self.max_size_bytes:
+                break
+            if os.path.abspath(path) in keep:
+                continue
+            self.logger.info(f"Evicting cache entry {path} ({manifest.get('bytes', 0) / 1024 / 1024:.1f}MB)")
+            shutil.rmtree(path, ignore_errors=True)
+            total -= manifest.get('bytes', 0)
+
+class FrameArchiveWriter:
+    """Append encoded frames to a packed archive: one data file plus an offset/length/duration index"""
+    def __init__(self, directory):
+        self.directory = directory
+        self.data_file = open(os.path.join(directory, FrameArchive.DATA_FILE), 'wb')
+        self.index = []
+        self.offset = 0
+
+    def append(self, frame_bytes, duration):
+        self.data_file.write(frame_bytes)
+        self.index.append((self.offset, len(frame_bytes), duration))
+        self.offset += len(frame_bytes)
+
+    def close(self):
+        """Flush the data file and write the index, after which the archive can be opened"""
+        if self.data_file.closed:
+            return
+        self.data_file.close()
+        with open(os.path.join(self.directory, FrameArchive.INDEX_FILE), 'wb') as f:
+            f.write(FrameArchive.HEADER.pack(FrameArchive.MAGIC, FrameArchive.FORMAT_VERSION, len(self.index)))
+            for entry in self.index:
+                f.write(FrameArchive.RECORD.pack(*entry))
+
+class FrameArchive:
+    """Read-only, memory-mapped view of a packed frame archive.
+
+    ``frames`` holds (memoryview, duration) pairs pointing straight into the
+    mapping, so loading an archive costs one open and one mmap regardless of
+    the frame count, and the OS page cache is the only copy of the data.
+    """
+    DATA_FILE = "frames.bin"
+    INDEX_FILE = "frames.idx"
+    MAGIC = b"WBFA"
+    FORMAT_VERSION = 1
+    HEADER = struct.Struct('<4sIQ')   # magic, version, frame count
+    RECORD = struct.Struct('<QId')    # offset, length, duration in seconds
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.index = self.read_index(directory)
+
+        with open(os.path.join(directory, self.DATA_FILE), 'rb') as f:
+            self.mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mapping)
+        self.frames = [(self.view[offset:offset + length], duration) for offset, length, duration in self.index]
+
+    @classmethod
+    def read_index(cls, directory):
+        """Return the archive's (offset, length, duration) records"""
+        with open(os.path.join(directory, cls.INDEX_FILE), 'rb') as f:
+            index_bytes = f.read()
+        magic, version, count = cls.HEADER.unpack_from(index_bytes)
+        if magic != cls.MAGIC or version != cls.FORMAT_VERSION:
+            raise ValueError(f"Unsupported frame archive in {directory}")
+        return list(cls.RECORD.iter_unpack(index_bytes[cls.HEADER.size:cls.HEADER.size + count * cls.RECORD.size]))
+
+    @staticmethod
+    def exists(directory):
+        return os.path.exists(os.path.join(directory, FrameArchive.INDEX_FILE))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def close(self):
+        """Release the mapping once no frames handed out earlier are still referenced"""
+        self.frames = []
+        try:
+            self.view.release()
+            self.mapping.close()
+        except BufferError:
+            pass  # Frames are still queued somewhere; the mapping closes when they are collected
+
+class FrameStream:
+    """Read a packed frame archive in playback order with a bounded read-ahead buffer.
+
+    A prefetch thread reads frames from ``frames.bin`` into a ring of ready
+    frames holding at most ``budget_bytes`` (but always at least two frames),
+    wrapping from the last frame back to the first so looping never waits on
+    a read. Only the ring is resident, however long the source is.
+    """
+    def __init__(self, directory, budget_bytes):
+        self.directory = directory
+        self.budget_bytes = budget_bytes
+        self.index = FrameArchive.read_index(directory)
+        self.data_file = open(os.path.join(directory, FrameArchive.DATA_FILE), 'rb')
+        self.ring = deque()
+        self.ring_bytes = 0
+        self.condition = threading.Condition()
+        self.running = False
+        self.underruns = 0  # Times playback had to wait for a read
+        self.prefetch_thread = None
+
+    def __len__(self):
+        return len(self.index)
+
+    def start(self, position=0):
+        """Start reading ahead, from frame ``position`` on"""
+        self.running = True
+        self.prefetch_thread = threading.Thread(target=self.prefetch, args=(position % len(self.index),), name="prefetch", daemon=True)
+        self.prefetch_thread.start()
+
+    def prefetch(self, position=0):
+        """Keep the ring filled up to the budget, looping over the archive"""
+        while self.running:
+            offset, length, duration = self.index[position]
+            with self.condition:
+                while self.running and len(self.ring) >= 2 and self.ring_bytes + length > self.budget_bytes:
+                    self.condition.wait()
+                if not self.running:
+                    break
+            self.data_file.seek(offset)
+            frame_bytes = self.data_file.read(length)
+            with self.condition:
+                self.ring.append((frame_bytes, duration))
+                self.ring_bytes += length
+                self.condition.notify_all()
+            position = (position + 1) % len(self.index)
+
+    def next_frame(self, timeout=None):
+        """Return the next (frame_bytes, duration) pair, or None if none was ready within ``timeout``"""
+        with self.condition:
+            if not self.ring:
+                self.underruns += 1
+                if not self.condition.wait_for(lambda: self.ring or not self.running, timeout=timeout) or not self.ring:
+                    return None
+            frame_bytes, duration = self.ring.popleft()
+            self.ring_bytes -= len(frame_bytes)
+            self.condition.notify_all()
+        return frame_bytes, duration
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.prefetch_thread is not None:
+            self.prefetch_thread.join(timeout=2)
+        self.data_file.close()
+        self.ring.clear()
+        self.ring_bytes = 0
+
+class FrameTally:
+    """Stand-in for frames_data that counts processed frames without keeping them, for streaming playback"""
+    def __init__(self):
+        self.count = 0
+
+    def append(self, frame):
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+class DeltaFrameWriter:
+    """Build a keyframe + delta archive from encoded frames, in place of a FrameArchiveWriter.
+
+    Frames are cut into DELTA_TILE tiles. A keyframe is stored as the encoded
+    frame itself; every other frame stores a bit mask of the tiles that
+    changed and those tiles packed into one small mosaic image, encoded in the
+    frame format. Changes are measured against the frame as it will be
+    reconstructed rather than the previous source frame, so encoding error
+    can't accumulate across deltas.
+    """
+    def __init__(self, directory, frame_format, quality, logger):
+        self.directory = directory
+        self.frame_format = frame_format  # Set by the animator once 'auto' has picked one
+        self.quality = quality
+        self.logger = logger
+        self.data_file = open(os.path.join(directory, DeltaFrameStore.DATA_FILE), 'wb')
+        self.offset = 0
+        self.records = []  # (kind, offset, length, duration) per frame
+        self.masks = []
+        self.source_bytes = 0
+        self.changed_tiles = 0
+        self.state = None  # Reconstructed previous frame, padded to whole tiles
+        self.size = None
+        self.grid = None  # (rows, cols) of tiles
+
+    def append(self, frame_bytes, duration):
+        frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            raise ValueError(f"Could not decode frame {len(self.records)} for the delta store")
+        height, width = frame.shape[:2]
+        if self.state is None:
+            self.size = (width, height)
+            self.grid = (-(-height // DELTA_TILE), -(-width // DELTA_TILE))
+            self.state = np.zeros((self.grid[0] * DELTA_TILE, self.grid[1] * DELTA_TILE, 3), np.uint8)
+            self.incoming = np.zeros_like(self.state)
+        self.incoming[:height, :width] = frame
+        self.source_bytes += len(frame_bytes)
+
+        rows, cols = self.grid
+        diff = cv2.absdiff(self.incoming, self.state).reshape(rows, DELTA_TILE, cols, DELTA_TILE * 3)
+        changed = diff.sum(axis=(1, 3), dtype=np.uint32) > DELTA_THRESHOLD * DELTA_TILE * DELTA_TILE * 3
+        if len(self.records) % DELTA_KEYFRAME_INTERVAL == 0 or changed.mean() > DELTA_KEYFRAME_CHANGE:
+            self.state[:] = self.incoming
+            self.write(0, bytes(frame_bytes), duration, np.zeros(rows * cols, bool))
+            return
+        tile_rows, tile_cols = np.nonzero(changed)
+        payload = b''
+        if len(tile_rows):
+            tiles = self.incoming.reshape(rows, DELTA_TILE, cols, DELTA_TILE, 3)[tile_rows, :, tile_cols]
+            extension, params, _, _ = FRAME_FORMATS[self.frame_format or 'jpeg']
+            success, encoded = cv2.imencode(extension, tiles_to_mosaic(tiles), params(self.quality))
+            if not success:
+                raise ValueError(f"Could not encode the changed tiles of frame {len(self.records)}")
+            payload = encoded.tobytes()
+            # Continue from the tiles as they will be decoded, not as they were
+            decoded = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+            self.state.reshape(rows, DELTA_TILE, cols, DELTA_TILE, 3)[tile_rows, :, tile_cols] = mosaic_to_tiles(decoded, len(tile_rows))
+            self.changed_tiles += len(tile_rows)
+        self.write(1, payload, duration, changed.ravel())
+
+    def write(self, kind, payload, duration, changed):
+        self.data_file.write(payload)
+        self.records.append((kind, self.offset, len(payload), duration))
+        self.masks.append(np.packbits(changed))
+        self.offset += len(payload)
+
+    def summary(self):
+        """Frame, keyframe and byte counts of the store, with its size relative to independent frames"""
+        stored_bytes = self.offset + sum(mask.nbytes for mask in self.masks) + len(self.records) * 25  # Kind, offset, length, duration
+        deltas = sum(1 for kind, _, _, _ in self.records if kind == 1)
+        tiles = self.grid[0] * self.grid[1] if self.grid else 0
+        return {
+            'frames': len(self.records),
+            'keyframes': len(self.records) - deltas,
+            'changed_tiles': self.changed_tiles / deltas / tiles if deltas and tiles else 0.0,
+            'stored_bytes': stored_bytes,
+            'source_bytes': self.source_bytes,
+            'ratio': self.source_bytes / stored_bytes if stored_bytes else 0.0,
+        }
+
+    def close(self):
+        """Flush the tile data and write the index, after which the store can be opened"""
+        if self.data_file.closed:
+            return
+        self.data_file.close()
+        if self.state is None:
+            return
+        kinds, offsets, lengths, durations = zip(*self.records)
+        width, height = self.size
+        meta = {'version': DeltaFrameStore.FORMAT_VERSION, 'width': width, 'height': height, 'tile': DELTA_TILE,
+                'frame_format': self.frame_format or 'jpeg', 'quality': self.quality, 'source_bytes': self.source_bytes}
+        with open(os.path.join(self.directory, DeltaFrameStore.INDEX_FILE), 'wb') as f:
+            np.savez(f, kinds=np.array(kinds, np.uint8), offsets=np.array(offsets, np.int64), lengths=np.array(lengths, np.int64),
+                     durations=np.array(durations, np.float64), masks=np.stack(self.masks), meta=np.array(json.dumps(meta)))
+        summary = self.summary()
+        self.logger.info(f"Delta store: {summary['frames']} frames, {summary['keyframes']} keyframes, "
+                         f"{summary['changed_tiles'] * 100:.1f}% of tiles changed per delta frame, "
+                         f"{summary['stored_bytes'] / 1024 / 1024:.1f}MB instead of {summary['source_bytes'] / 1024 / 1024:.1f}MB "
+                         f"({summary['ratio']:.1f}x smaller)")
+
+def tiles_to_mosaic(tiles):
+    """Pack (count, tile, tile, 3) tiles into one near-square image"""
+    count, tile = len(tiles), tiles.shape[1]
+    cols = math.ceil(math.sqrt(count))
+    rows = -(-count // cols)
+    grid = np.zeros((rows * cols, tile, tile, 3), np.uint8)
+    grid[:count] = tiles
+    return grid.reshape(rows, cols, tile, tile, 3).swapaxes(1, 2).reshape(rows * tile, cols * tile, 3)
+
+def mosaic_to_tiles(mosaic, count, tile=DELTA_TILE):
+    """The first ``count`` tiles of a mosaic made by tiles_to_mosaic"""
+    rows, cols = mosaic.shape[0] // tile, mosaic.shape[1] // tile
+    return mosaic.reshape(rows, tile, cols, tile, 3).swapaxes(1, 2).reshape(rows * cols, tile, tile, 3)[:count]
+
+class DeltaFrameStore:
+    """Play a keyframe + delta archive, rebuilding frames just ahead of playback.
+
+    Only the index, the change masks and the memory-mapped tile data stay
+    resident. A prefetch thread reconstructs frames in playback order into a
+    small read-ahead ring, wrapping from the last frame to the first (always a
+    keyframe), and keeps the last few reconstructed frames so the next one
+    only needs its own tiles applied. It has the same interface as
+    FrameStream. Reconstruction time over the first DELTA_CHECK_FRAMES frames
+    is checked against the time one frame is shown.
+    """
+    DATA_FILE = "delta.bin"
+    INDEX_FILE = "delta.npz"
+    FORMAT_VERSION = 1
+
+    def __init__(self, directory, frame_delay, logger):
+        self.directory = directory
+        self.frame_delay = frame_delay
+        self.logger = logger
+        with np.load(os.path.join(directory, self.INDEX_FILE)) as index:
+            self.kinds = index['kinds']
+            self.offsets = index['offsets']
+            self.lengths = index['lengths']
+            self.durations = index['durations']
+            self.masks = index['masks']
+            meta = json.loads(str(index['meta']))
+        if meta.get('version') != self.FORMAT_VERSION:
+            raise ValueError(f"Unsupported delta store in {directory}")
+        self.width, self.height, self.tile = meta['width'], meta['height'], meta['tile']
+        self.grid = (-(-self.height // self.tile), -(-self.width // self.tile))
+        self.source_bytes = meta['source_bytes']
+        extension, params, _, _ = FRAME_FORMATS[meta['frame_format']]
+        self.extension, self.params = extension, params(meta['quality'])
+        data_path = os.path.join(directory, self.DATA_FILE)
+        self.data = np.memmap(data_path, np.uint8, mode='r') if os.path.getsize(data_path) else np.zeros(0, np.uint8)
+        self.keyframes = np.flatnonzero(self.kinds == 0)
+        self.states = OrderedDict()  # Reconstructed frames (padded to whole tiles) by index, oldest first
+        self.reconstruct_times = []
+        self.ring = deque()
+        self.condition = threading.Condition()
+        self.running = False
+        self.underruns = 0  # Times playback had to wait for a frame
+        self.prefetch_thread = None
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, cls.INDEX_FILE))
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def stored_bytes(self):
+        return self.data.nbytes + sum(array.nbytes for array in (self.kinds, self.offsets, self.lengths, self.durations, self.masks))
+
+    def describe(self):
+        stored_bytes = self.stored_bytes()
+        return (f"{len(self)} frames ({len(self.keyframes)} keyframes) in {stored_bytes / 1024 / 1024:.1f}MB instead of "
+                f"{self.source_bytes / 1024 / 1024:.1f}MB as independent frames ({self.source_bytes / max(1, stored_bytes):.1f}x smaller)")
+
+    def payload(self, index):
+        return self.data[self.offsets[index]:self.offsets[index] + self.lengths[index]]
+
+    def apply_delta(self, state, index):
+        """Paste frame ``index``'s changed tiles onto the reconstruction of the frame before it"""
+        rows, cols = self.grid
+        changed = np.unpackbits(self.masks[index], count=rows * cols).reshape(rows, cols)
+        tile_rows, tile_cols = np.nonzero(changed)
+        if len(tile_rows):
+            mosaic = cv2.imdecode(np.asarray(self.payload(index)), cv2.IMREAD_COLOR)
+            state.reshape(rows, self.tile, cols, self.tile, 3)[tile_rows, :, tile_cols] = mosaic_to_tiles(mosaic, len(tile_rows), self.tile)
+
+    def reconstruct(self, index):
+        """The full (padded) image of frame ``index``, starting from the closest kept frame or keyframe"""
+        if index in self.states:
+            self.states.move_to_end(index)
+            return self.states[index]
+        keyframe = self.keyframes[bisect.bisect_right(self.keyframes, index) - 1]
+        base = max((kept for kept in self.states if keyframe <= kept < index), default=None)
+        if base is None:
+            state = np.zeros((self.grid[0] * self.tile, self.grid[1] * self.tile, 3), np.uint8)
+            state[:self.height, :self.width] = cv2.imdecode(np.asarray(self.payload(keyframe)), cv2.IMREAD_COLOR)
+            base = keyframe
+        else:
+            state = self.states[base].copy()
+        for position in range(base + 1, index + 1):
+            self.apply_delta(state, position)
+        self.states[index] = state
+        while len(self.states) > DELTA_FRAME_CACHE:
+            self.states.popitem(last=False)
+        return state
+
+    def frame(self, index):
+        """Frame ``index`` as (encoded bytes, duration)"""
+        start_time = time.perf_counter()
+        state = self.reconstruct(index)
+        if self.kinds[index] == 0:
+            frame_bytes = self.payload(index).tobytes()
+        else:
+            success, encoded = cv2.imencode(self.extension, state[:self.height, :self.width], self.params)
+            if not success:
+                raise ValueError(f"Could not encode reconstructed frame {index}")
+            frame_bytes = encoded.tobytes()
+        self.observe(time.perf_counter() - start_time)
+        return frame_bytes, float(self.durations[index])
+
+    def observe(self, seconds):
+        """Time the first frames and check the cost against the frame budget once enough were seen"""
+        sample_size = min(DELTA_CHECK_FRAMES, len(self))
+        if len(self.reconstruct_times) >= sample_size:
+            return
+        self.reconstruct_times.append(seconds)
+        if len(self.reconstruct_times) == sample_size:
+            mean_ms = sum(self.reconstruct_times) / sample_size * 1000
+            worst_ms = max(self.reconstruct_times) * 1000
+            budget_ms = self.frame_delay * 1000
+            message = (f"Delta reconstruction takes {mean_ms:.1f} ms per frame on average ({worst_ms:.1f} ms worst) "
+                       f"against a {budget_ms:.1f} ms frame budget")
+            if mean_ms > budget_ms:
+                self.logger.warning(f"{message}; playback will drop frames. Use --frame-store archive or a lower --scale.")
+            else:
+                self.logger.info(message)
+
+    def start(self):
+        self.running = True
+        self.prefetch_thread = threading.Thread(target=self.prefetch, name="reconstruct", daemon=True)
+        self.prefetch_thread.start()
+
+    def prefetch(self):
+        """Keep DELTA_READ_AHEAD reconstructed frames ready, looping over the store"""
+        position = 0
+        while self.running:
+            with self.condition:
+                while self.running and len(self.ring) >= DELTA_READ_AHEAD:
+                    self.condition.wait()
+                if not self.running:
+                    break
+            try:
+                item = self.frame(position)
+            except Exception as e:
+                self.logger.error(f"Could not reconstruct frame {position}: {e}")
+                item = None
+            with self.condition:
+                if item is not None:
+                    self.ring.append(item)
+                self.condition.notify_all()
+            position = (position + 1) % len(self)
+
+    def next_frame(self, timeout=None):
+        """Return the next (frame_bytes, duration) pair, or None if none was ready within ``timeout``"""
+        with self.condition:
+            if not self.ring:
+                self.underruns += 1
+                if not self.condition.wait_for(lambda: self.ring or not self.running, timeout=timeout) or not self.ring:
+                    return None
+            item = self.ring.popleft()
+            self.condition.notify_all()
+        return item
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.prefetch_thread is not None:
+            self.prefetch_thread.join(timeout=2)
+        self.ring.clear()
+        self.states.clear()
+
+class PreprocessCancelled(Exception):
+    """Processing stopped early because its animator was stopped or cleaned up"""
+
 class EnhancedWallpaperAnimator:
-    def __init__(self, input_path, target_fps=15, quality=80, scale_factor=0.75, ram_disk_size_mb=512, enable_frame_skipping=True):
+    MAX_CATCHUP_SECONDS = 1.0  # Drop late frames up to this far behind, re-anchor the schedule beyond it
+
+    def __init__(self, input_path, target_fps=15, quality=80, scale_factor=0.75, ram_disk_size_mb=512, enable_frame_skipping=True,
+                 workers=None, progressive='loop', cache_size_mb=2048, resize_filter=None, dedup_threshold=None,
+                 sink=None, cache_dir=None, metrics_file=None, metrics_interval=5.0, adaptive=True, latency_budget=None,
+                 playback='staged', stream_budget_mb=32, layout=None, frame_format='jpeg', monitors=None,
+                 staging_backend=None, staging_path=None, staging=None, frame_store='archive', pipeline='threaded',
+                 keep_frames=True):
+        self.startup = StartupTimer()
         self.input_path = input_path
         self.target_fps = target_fps
         self.frame_delay = 1.0 / target_fps
-        self.quality = quality  # JPEG quality (0-100)
+        self.quality = quality  # JPEG/WebP quality (0-100)
+        self.frame_format = frame_format  # One of FRAME_FORMATS, or 'auto' to measure them on sample frames
+        self.encoded_format = None  # The format frames are actually encoded in, once known
+        self.format_trial = None  # Measurements behind an 'auto' choice
         self.scale_factor = scale_factor  # Scale factor for resolution
-        self.ram_disk_size_mb = ram_disk_size_mb  # Size of the RAM disk in MB
-        self.ram_disk_path = "R:\\"  # Default path for RAM Disk, change if needed
+        self.ram_disk_size_mb = ram_disk_size_mb  # Staging budget in MB (the size of a RAM disk created with ImDisk)
         self.enable_frame_skipping = enable_frame_skipping  # Toggle for frame skipping
+        self.workers = max(1, workers or os.cpu_count() or 1)  # Resize/encode worker threads
+        self.pipeline = pipeline  # 'threaded' decodes, encodes and writes on separate threads, 'inline' does one frame at a time
+        self.keep_frames = keep_frames  # Whether encoded frames stay in memory once they are staged as files
+        self.progressive = progressive  # Playback while preprocessing: 'loop', 'hold' or 'off'
+        self.playback = playback  # 'staged' writes every frame once and loops over paths, 'queue' rewrites rotating buffers,
+                                  # 'stream' reads frames from the archive as they are played
+        self.stream_budget_mb = stream_budget_mb  # Read-ahead buffer for 'stream' playback
+        self.frame_store = frame_store  # 'archive' keeps every frame whole, 'delta' keyframes plus changed tiles
+        self.layout_mode = layout  # 'fit', 'fill' or 'span' composes per-monitor renditions, None renders one frame
+        self.layout = None
+        self.source_dimensions = None  # (width, height) of the source, read from the manifest on cache hits
+        self.resize_filter = resize_filter  # Key of RESIZE_FILTERS, None for the per-format default
+        self.dedup_threshold = dedup_threshold  # Max hash distance for merging consecutive frames, None disables
+        self.dedup_stats = {'input_frames': 0, 'merged': 0}
+        self.last_pipeline_stats = None  # PipelineStats of the latest preprocessing run
+
+        # Playback telemetry, only collected when it is exported somewhere
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        self.metrics = PlaybackMetrics() if metrics_file else None
+
+        # Frame scheduling: late frames are dropped, and with adaptive pacing every Nth frame is
+        # shown while set_wallpaper takes longer than the latency budget (half a frame by default)
+        self.adaptive = adaptive
+        self.latency_budget = latency_budget if latency_budget is not None else self.frame_delay / 2
 
         # Initialize logging
         logging.basicConfig(level=logging.INFO,
@@ -48,75 +1476,188 @@ class EnhancedWallpaperAnimator:
         else:
             self.logger.info("Frame skipping is DISABLED.")
 
-        # Flag to track if RAM disk was created by the script
-        self.created_ram_disk = False
+        # Where frames are delivered; only sinks that read image files need staging storage
+        self.sink = sink or create_sink()
+        self.logger.info(f"Wallpaper sink: {self.sink.name}")
 
-        # Create RAM disk if it doesn't exist
-        self.create_ram_disk()
+        # Staging storage for frame files; only sinks that read image files need it. A storage
+        # passed in is shared with other animators and left open by cleanup()
+        self.owns_staging = staging is None and self.sink.needs_file
+        if self.owns_staging:
+            staging = create_staging(staging_backend, staging_path, ram_disk_size_mb, self.logger)
+        self.staging = staging if self.sink.needs_file else None
+        self.startup.mark('sink')
 
         # Initialize frame queue
         self.frame_queue = queue.Queue(maxsize=1000)
         self.running = False
+        self.paused = False
+        self.consumer_thread = None
+
+        # Set once every frame of the source is in frames_data
+        self.frames_complete = threading.Event()
+        # Set whenever a frame is added to frames_data, so the producer picks it up without polling
+        self.frame_added = threading.Event()
+        # Set by stop() and cleanup() so a preprocess still running gives up instead of publishing
+        self.cancelled = threading.Event()
+        self.start_time = time.perf_counter()
+        self.first_frame_time = None
 
         # Create the AnimationFrames directory
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
-        self.animation_frames_dir = os.path.join(self.script_dir, "AnimationFrames")
+        self.animation_frames_dir = cache_dir or os.path.join(self.script_dir, "AnimationFrames")
         os.makedirs(self.animation_frames_dir, exist_ok=True)
 
-        # Set up directories based on input file name
+        self.cache = FrameCache(self.animation_frames_dir, cache_size_mb, self.logger)
+        # screeninfo is only imported where the OS can't be asked directly, it is the slowest step of a cached start
+        self.monitors = monitors or detect_monitors_native() or detect_monitors()
+        self.startup.mark('monitors')
+        self.pinned_entries = set()  # Cache entries other animators in this process are playing, never evicted
+
+        # Set up directories based on input file name, source content and processing parameters
         self.input_filename = Path(self.input_path).stem.replace(".", "_")
         self.input_extension = Path(self.input_path).suffix.lower().strip('.')
-        self.archive_dir = os.path.join(self.animation_frames_dir, f"{self.input_filename}_{self.input_extension}")
-        os.makedirs(self.archive_dir, exist_ok=True)
+        self.source_digest = self.cache.source_digest(self.input_path)
+        self.cache_key = self.cache.make_key(self.source_digest, self.cache_params())
+        self.startup.mark('cache key')
+        self.archive_dir = self.cache.entry_dir(f"{self.input_filename}_{self.input_extension}", self.cache_key)
         self.logger.info(f"Archive directory set at {self.archive_dir}")
+        self.archive_writer = None
+        self.build_path = None  # Cache build directory while preprocess runs
+        self.frame_archive = None
 
         # Initialize in-memory buffers
         self.buffer_count = 16
         self.temp_buffers = [BytesIO() for _ in range(self.buffer_count)]
-        self.temp_image_paths = [os.path.join(self.ram_disk_path, f"temp_frame_{i}.jpg") for i in range(self.buffer_count)]
+        self.use_frame_format(frame_format if frame_format != 'auto' else None)
         self.current_buffer = 0
 
         # Lock for switching buffers
         self.buffer_lock = threading.Lock()
 
-    def create_ram_disk(self):
-        """Automatically create a RAM disk using ImDisk if it doesn't exist."""
-        if os.path.exists(self.ram_disk_path) and os.path.isdir(self.ram_disk_path):
-            self.logger.info(f"RAM disk at {self.ram_disk_path} already exists. Skipping creation.")
-            self.created_ram_disk = False
+        # Staged playback: every frame written once, the loop only hands the sink a path
+        self.staged_name = f"staged_{id(self):x}"
+        self.staged_frames = None
+        self.frame_stream = None
+
+    def cache_params(self):
+        """Every setting that changes the processed frames, used as part of the cache key"""
+        return {
+            'target_fps': self.target_fps,
+            'quality': self.quality,
+            'scale_factor': self.scale_factor,
+            'enable_frame_skipping': self.enable_frame_skipping,
+            'resize_filter': self.resize_filter,
+            'dedup_threshold': self.dedup_threshold,
+            'monitors': [(m.x, m.y, m.width, m.height) for m in self.monitors],
+            'layout': self.layout_mode,
+            'frame_format': self.frame_format,
+            'frame_store': self.frame_store,
+        }
+
+    def use_frame_format(self, name):
+        """Encode (or play back) frames in the given format, None meaning not chosen yet"""
+        self.encoded_format = name
+        if isinstance(self.archive_writer, DeltaFrameWriter):
+            self.archive_writer.frame_format = name
+        self.frame_extension = FRAME_FORMATS[name or 'jpeg'][0]
+        self.temp_image_names = [f"temp_frame_{i}{self.frame_extension}" for i in range(self.buffer_count)]
+
+    def sample_frames(self, count):
+        """Decode up to ``count`` frames spread evenly over the source, as they would reach the encoder"""
+        samples = []
+        if self.is_video_file():
+            cap = cv2.VideoCapture(self.input_path)
+            total_frames = max(1, int(cap.get(cv2.CAP_PROP_FRAME_COUNT)))
+            for position in sorted({total_frames * i // count for i in range(count)}):
+                cap.set(cv2.CAP_PROP_POS_FRAMES, position)
+                ret, frame = cap.read()
+                if ret:
+                    samples.append(frame)
+            cap.release()
         else:
-            self.logger.info(f"Creating a RAM disk of size {self.ram_disk_size_mb}MB at {self.ram_disk_path}...")
-            try:
-                # ImDisk command to create a RAM disk
-                subprocess.run(
-                    ["imdisk", "-a", "-s", f"{self.ram_disk_size_mb}M", "-m", self.ram_disk_path, "-p", "/fs:ntfs /q /y"],
-                    check=True
-                )
-                self.logger.info(f"RAM disk created successfully at {self.ram_disk_path}")
-                self.created_ram_disk = True
-            except subprocess.CalledProcessError as e:
-                self.logger.error(f"Failed to create RAM disk: {e}")
-                raise
-
-    def remove_ram_disk(self):
-        """Remove the RAM disk when done, only if it was created by the script."""
-        if self.created_ram_disk:
-            self.logger.info(f"Removing RAM disk at {self.ram_disk_path}...")
+            with Image.open(self.input_path) as img:
+                total_frames = getattr(img, 'n_frames', 1)
+                for position in sorted({total_frames * i // count for i in range(count)}):
+                    img.seek(position)
+                    samples.append(img.convert('RGB'))
+        return samples
+
+    def choose_frame_format(self, new_width, new_height):
+        """Pick a frame format for --format auto by trying each one on a few sample frames.
+
+        Every format is timed encoding the samples and having the sink apply
+        them. Of the formats whose encode time (spread over the workers) and
+        apply time both fit in a frame at the target FPS, the one with the
+        smallest frames wins; if none fits, the one the sink applies fastest.
+        """
+        samples = self.sample_frames(AUTO_FORMAT_SAMPLES)
+        encode = self._encode_frame if self.is_video_file() else self._encode_gif_frame
+        stats = self.pipeline_stats()
+        results = {}
+        for name, (extension, _, _, _) in FRAME_FORMATS.items():
+            if not samples or not frame_format_supported(name):
+                continue
+            probe_name = f"probe{extension}"
+            encode_times, sizes, apply_times = [], [], []
             try:
-                # ImDisk command to remove the RAM disk
-                subprocess.run(
-                    ["imdisk", "-D", "-m", self.ram_disk_path],
-                    check=True
-                )
-                self.logger.info("RAM disk removed successfully.")
-            except subprocess.CalledProcessError as e:
-                self.logger.error(f"Failed to remove RAM disk: {e}")
+                for index, frame in enumerate(samples):
+                    start_time = time.perf_counter()
+                    frame_bytes = encode(frame, new_width, new_height, index, stats, frame_format=name)
+                    encode_times.append(time.perf_counter() - start_time)
+                    if frame_bytes is None:
+                        break
+                    sizes.append(len(frame_bytes))
+                    start_time = time.perf_counter()
+                    if self.sink.needs_file:
+                        self.sink.set_frame(image_path=self.staging.write(probe_name, frame_bytes))
+                    else:
+                        self.sink.set_frame(frame_bytes=frame_bytes)
+                    apply_times.append(time.perf_counter() - start_time)
+            except StagingFull:
+                pass
+            finally:
+                if self.staging is not None:
+                    self.staging.remove(probe_name)
+            if len(apply_times) != len(samples):
+                continue
+            results[name] = {
+                'encode_ms': sum(encode_times) / len(encode_times) * 1000,
+                'apply_ms': sum(apply_times) / len(apply_times) * 1000,
+                'frame_kb': sum(sizes) / len(sizes) / 1024,
+            }
+            self.logger.info(f"Format {name}: encode {results[name]['encode_ms']:.1f} ms, apply {results[name]['apply_ms']:.1f} ms, "
+                             f"{results[name]['frame_kb']:.0f} KB per frame")
+
+        budget_ms = self.frame_delay * 1000
+        fitting = [name for name, result in results.items()
+                   if result['encode_ms'] / self.workers <= budget_ms and result['apply_ms'] <= budget_ms]
+        if fitting:
+            choice = min(fitting, key=lambda name: results[name]['frame_kb'])
+        elif results:
+            choice = min(results, key=lambda name: results[name]['apply_ms'])
+            self.logger.warning(f"No frame format keeps up with {self.target_fps} FPS, using the fastest to apply.")
         else:
-            self.logger.info(f"RAM disk at {self.ram_disk_path} was not created by the script. Skipping removal.")
+            choice = 'jpeg'
+        self.format_trial = results
+        self.logger.info(f"Chose frame format {choice}")
+        return choice
+
+    def source_size(self):
+        """(width, height) of the source, opening it only if the cache didn't already say"""
+        if self.source_dimensions is None:
+            if self.is_video_file():
+                cap = cv2.VideoCapture(self.input_path)
+                self.source_dimensions = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+                cap.release()
+            else:
+                with Image.open(self.input_path) as img:
+                    self.source_dimensions = img.size
+        return self.source_dimensions
 
     def get_optimal_monitor_resolution(self):
         """Get the optimal resolution while maintaining aspect ratio"""
-        monitors = get_monitors()
+        monitors = self.monitors
         max_width = max(monitor.width for monitor in monitors)
         max_height = max(monitor.height for monitor in monitors)
 
@@ -124,14 +1665,14 @@ class EnhancedWallpaperAnimator:
         max_width = int(max_width * self.scale_factor)
         max_height = int(max_height * self.scale_factor)
 
-        if self.is_video_file():
-            cap = cv2.VideoCapture(self.input_path)
-            orig_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
-            orig_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            cap.release()
-        else:
-            with Image.open(self.input_path) as img:
-                orig_width, orig_height = img.size
+        orig_width, orig_height = self.source_size()
+
+        if self.layout_mode is not None:
+            self.layout = MonitorLayout(monitors, self.layout_mode, self.scale_factor, (orig_width, orig_height))
+            new_width, new_height = self.layout.canvas_size
+            self.logger.info(f"Composing {len(monitors)} monitor rendition(s) ({self.layout_mode}) on a {new_width}x{new_height} canvas, "
+                             f"{self.layout.visible_pixels()} visible pixels")
+            return new_width, new_height
 
         aspect_ratio = orig_width / orig_height
 
@@ -147,17 +1688,16 @@ class EnhancedWallpaperAnimator:
 
     def is_video_file(self):
         """Check if the input file is a video format"""
-        video_extensions = {'.mp4', '.avi', '.mkv', '.mov', '.wmv'}
-        return Path(self.input_path).suffix.lower() in video_extensions
+        return Path(self.input_path).suffix.lower() in VIDEO_EXTENSIONS
             
-    def load_frames_from_directory(self):
-        """Load preprocessed frames from the RAM disk into memory"""
+    def load_frames_from_directory(self, frames_dir):
+        """Load frames stored as individual frame_N.jpg files (the pre-archive layout) into memory"""
         frames_data = []
-        frame_files = sorted(Path(self.frames_dir).glob("frame_*.jpg"),
+        frame_files = sorted(Path(frames_dir).glob("frame_*.jpg"),
                              key=lambda x: int(x.stem.split('_')[1]))  # Sort by frame number
 
         if not frame_files:
-            self.logger.warning(f"No frame files found in {self.frames_dir}")
+            self.logger.warning(f"No frame files found in {frames_dir}")
             return frames_data
 
         for frame_file in frame_files:
@@ -168,306 +1708,1364 @@ class EnhancedWallpaperAnimator:
             except Exception as e:
                 self.logger.error(f"Failed to load frame {frame_file}: {e}")
 
-        self.logger.info(f"Loaded {len(frames_data)} frames from {self.frames_dir}")
+        self.logger.info(f"Loaded {len(frames_data)} frames from {frames_dir}")
         return frames_data
             
     def load_frames_from_archive(self):
-        """Copy archived frames into RAM disk for faster access"""
-        self.logger.info(f"Copying frames from {self.archive_dir} to RAM disk at {self.frames_dir}...")
+        """Memory-map the packed frame archive of the current cache entry"""
+        self.logger.info(f"Mapping frames from {self.archive_dir}...")
         try:
-            shutil.copytree(self.archive_dir, self.frames_dir, dirs_exist_ok=True)
-            self.logger.info("Frames successfully loaded into RAM disk.")
+            self.frame_archive = FrameArchive(self.archive_dir)
         except Exception as e:
-            self.logger.error(f"Failed to load frames into RAM disk: {e}")
+            self.logger.error(f"Failed to load frame archive: {e}")
+            raise
+        self.logger.info(f"Mapped {len(self.frame_archive)} frames ({len(self.frame_archive.mapping) / 1024 / 1024:.1f}MB).")
+        return self.frame_archive.frames
+
+    def convert_legacy_archive(self, legacy_dir):
+        """Pack a directory of frame_N.jpg files into a cache entry for the current parameters.
+
+        The frames are assumed to have been produced with the same settings
+        this animator was created with; nothing is re-encoded.
+        """
+        if self.cache.lookup(self.archive_dir) is not None:
+            self.logger.info(f"Cache entry {self.archive_dir} already exists. Skipping conversion of {legacy_dir}.")
+            return False
+        frames_data = self.load_frames_from_directory(legacy_dir)
+        if not frames_data:
+            return False
+        build_dir = self.cache.begin(self.archive_dir)
+        try:
+            writer = FrameArchiveWriter(build_dir)
+            for frame_bytes, duration in frames_data:
+                writer.append(frame_bytes, duration)
+            writer.close()
+            self.cache.publish(build_dir, self.archive_dir, self.build_manifest(frames_data))
+        except Exception:
+            self.cache.discard(build_dir)
             raise
+        shutil.rmtree(legacy_dir, ignore_errors=True)
+        self.logger.info(f"Converted {legacy_dir} into {self.archive_dir}")
+        return True
 
-    def process_video(self):
-        """Process video files with or without frame skipping to maintain target FPS"""
+    def process_video(self, frames_data=None):
+        """Process video files with or without frame skipping to maintain target FPS.
+
+        Frames are appended to ``frames_data`` as soon as they are encoded, so a
+        caller passing its own list can start playback before processing ends.
+        """
         cap = cv2.VideoCapture(self.input_path)
-        frames_data = []
         new_width, new_height = self.get_optimal_monitor_resolution()
+        if self.encoded_format is None:
+            self.use_frame_format(self.choose_frame_format(new_width, new_height))
         
         # Get source video properties
         source_fps = cap.get(cv2.CAP_PROP_FPS)
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         
-        if self.enable_frame_skipping:
-            # Calculate frame skip based on source and target FPS
-            frame_skip = max(1, round(source_fps / self.target_fps))
-            actual_fps = source_fps / frame_skip
-            frame_duration = 1.0 / self.target_fps  # Maintain consistent playback speed
-            
+        resample = self.enable_frame_skipping and source_fps > 0
+        if resample:
             self.logger.info(f"Source FPS: {source_fps:.2f}, Target FPS: {self.target_fps}")
-            self.logger.info(f"Frame skip: {frame_skip}, Actual FPS: {actual_fps:.2f}")
+            self.logger.info(f"Resampling by presentation time, about 1 in {max(1.0, source_fps / self.target_fps):.2f} source frames kept")
         else:
-            # No frame skipping; adjust frame duration based on target FPS
-            frame_duration = 1.0 / self.target_fps  # Maintain consistent playback speed
             self.logger.info(f"Processing all frames without frame skipping. Target FPS: {self.target_fps}")
+        counts = {'retrieved': 0, 'grabbed': 0, 'seeks': 0}
 
-        frame_count = 0
-        saved_count = 0
-        
-        try:
+        def decode_all():
             while True:
+                start_time = time.perf_counter()
                 ret, frame = cap.read()
                 if not ret:
-                    break
-                
-                if self.enable_frame_skipping:
-                    if frame_count % frame_skip == 0:
-                        self._process_and_save_frame(frame, new_width, new_height, frames_data, saved_count)
-                        saved_count += 1
-                else:
-                    self._process_and_save_frame(frame, new_width, new_height, frames_data, saved_count)
-                    saved_count += 1
-                
-                frame_count += 1
-                
-                if self.enable_frame_skipping and saved_count % 100 == 0:
-                    self.logger.info(f"Processed {saved_count} frames...")
-                elif not self.enable_frame_skipping and saved_count % 100 == 0:
-                    self.logger.info(f"Processed {saved_count} frames...")
-                    
-        finally:
-            cap.release()
+                    return
+                stats.add('decode', time.perf_counter() - start_time)
+                counts['retrieved'] += 1
+                yield frame, self.frame_delay
+
+        def decode_resampled():
+            # Each target tick shows the first source frame presented at or after it.
+            # Frames no tick lands on are only grabbed (never retrieved or converted)
+            # and long stretches are skipped with a seek by time. Selecting by
+            # timestamp keeps variable frame rate sources at their real speed.
+            frame_interval_ms = 1000.0 / source_fps
+            tick_ms = 1000.0 / self.target_fps
+            tick = 0
+            seek_enabled = True
+            while True:
+                start_time = time.perf_counter()
+                target_ms = tick * tick_ms
+                seeked = False
+                if seek_enabled and tick > 0 and target_ms - cap.get(cv2.CAP_PROP_POS_MSEC) > SEEK_GAP_FRAMES * frame_interval_ms:
+                    seeked = cap.set(cv2.CAP_PROP_POS_MSEC, target_ms - 2 * frame_interval_ms)
+                    counts['seeks'] += seeked
+                while True:
+                    if not cap.grab():
+                        return
+                    pts_ms = cap.get(cv2.CAP_PROP_POS_MSEC)
+                    if pts_ms + 1e-3 >= target_ms:
+                        break
+                    counts['grabbed'] += 1
+                if seeked and pts_ms > target_ms + frame_interval_ms:
+                    self.logger.warning("Seeking overshot the wanted frame, falling back to grabbing every frame.")
+                    seek_enabled = False
+                ret, frame = cap.retrieve()
+                if not ret:
+                    return
+                # Every tick up to this frame's timestamp shows this frame
+                ticks = max(1, math.floor(pts_ms / tick_ms + 1e-6) - tick + 1)
+                tick += ticks
+                stats.add('decode', time.perf_counter() - start_time)
+                counts['retrieved'] += 1
+                yield frame, ticks * self.frame_delay
+
+        def decode_frames():
+            try:
+                yield from (decode_resampled() if resample else decode_all())
+            finally:
+                cap.release()
+
+        stats = self.pipeline_stats()
+        frames_data = self.run_frame_pipeline(self.deduplicate(decode_frames(), stats), new_width, new_height, stats, frames_data)
+        stats.finish()
+        self.last_pipeline_stats = stats
+        stats.log_summary(self.logger, pooled_stages=('resize', 'encode'))
             
-        self.logger.info(f"Processed {saved_count} frames from {total_frames} source frames")
+        self.logger.info(f"Processed {len(frames_data)} frames from {total_frames} source frames "
+                         f"({counts['retrieved']} retrieved, {counts['grabbed']} grabbed, {counts['seeks']} seeks)")
+        return frames_data
+
+    def pipeline_stats(self):
+        stages = ('decode', 'dedup', 'resize', 'encode', 'write') if self.dedup_threshold is not None else ('decode', 'resize', 'encode', 'write')
+        return PipelineStats(stages, self.workers if self.pipeline == 'threaded' else 1)
+
+    def deduplicate(self, frames, stats):
+        """Merge runs of consecutive near-identical frames into one frame shown for their combined duration.
+
+        Each frame's perceptual hash is compared with the last frame kept; if
+        it is within ``dedup_threshold`` bits, the frame is dropped and its
+        duration added to the kept one. Passes frames through when disabled.
+        """
+        if self.dedup_threshold is None:
+            yield from frames
+            return
+        held = None
+        for frame, duration in frames:
+            start_time = time.perf_counter()
+            frame_hash = perceptual_hash(frame)
+            duplicate = held is not None and hash_distance(frame_hash, held_hash) <= self.dedup_threshold
+            stats.add('dedup', time.perf_counter() - start_time)
+            self.dedup_stats['input_frames'] += 1
+            if duplicate:
+                held_duration += duration
+                self.dedup_stats['merged'] += 1
+                continue
+            if held is not None:
+                yield held, held_duration
+            held, held_hash, held_duration = frame, frame_hash, duration
+        if held is not None:
+            yield held, held_duration
+
+        input_frames = self.dedup_stats['input_frames']
+        hit_rate = self.dedup_stats['merged'] / input_frames * 100 if input_frames else 0.0
+        self.logger.info(f"Deduplication merged {self.dedup_stats['merged']} of {input_frames} frames ({hit_rate:.1f}%)")
+
+    def run_frame_pipeline(self, frames, new_width, new_height, stats, frames_data=None, encode=None):
+        """Resize and encode frames on a worker pool, then archive them in source order.
+
+        The decode stage runs on its own thread and pulls (frame, duration) pairs
+        from the ``frames`` iterator. Encode jobs are handed to the writer through a bounded queue
+        of futures, so frames are written in the order they were decoded and at
+        most a few frames per worker are held in memory at once.
+        """
+        frames_data = [] if frames_data is None else frames_data
+        encode = encode or self._encode_frame
+        if self.pipeline == 'inline':
+            return self.run_inline_pipeline(frames, new_width, new_height, stats, frames_data, encode)
+        pending = queue.Queue(maxsize=self.workers * 2)
+        decode_error = []
+
+        def decode_stage(executor):
+            try:
+                for saved_count, (frame, duration) in enumerate(frames):
+                    if self.cancelled.is_set():
+                        break
+                    pending.put((saved_count, duration, executor.submit(encode, frame, new_width, new_height, saved_count, stats)))
+            except Exception as e:
+                decode_error.append(e)
+            finally:
+                pending.put(None)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="encode") as executor:
+            decoder = threading.Thread(target=decode_stage, args=(executor,), name="decode", daemon=True)
+            decoder.start()
+            while True:
+                item = pending.get()
+                if item is None:
+                    break
+                saved_count, duration, future = item
+                self.archive_frame(frames_data, saved_count, future.result(), duration, stats)
+            decoder.join()
+
+        if decode_error:
+            raise decode_error[0]
+        if self.cancelled.is_set():
+            raise PreprocessCancelled(f"stopped after {len(frames_data)} frames")
         return frames_data
 
-    def _process_and_save_frame(self, frame, new_width, new_height, frames_data, saved_count):
-        """Helper method to resize, encode, and save a single frame"""
+    def run_inline_pipeline(self, frames, new_width, new_height, stats, frames_data, encode):
+        """Decode, resize, encode and archive one frame at a time on the calling thread.
+
+        Slower than the threaded pipeline, but only one decoded frame is ever
+        held and no decode or encode threads are started.
+        """
+        for saved_count, (frame, duration) in enumerate(frames):
+            if self.cancelled.is_set():
+                raise PreprocessCancelled(f"stopped after {len(frames_data)} frames")
+            frame_bytes = encode(frame, new_width, new_height, saved_count, stats)
+            del frame
+            self.archive_frame(frames_data, saved_count, frame_bytes, duration, stats)
+        return frames_data
+
+    def archive_frame(self, frames_data, saved_count, frame_bytes, duration, stats):
+        """Append one encoded frame to frames_data and the archive, skipping frames that failed to encode"""
+        if frame_bytes is None:
+            return
+        frames_data.append((frame_bytes, duration))
+        self.frame_added.set()
+        start_time = time.perf_counter()
         try:
-            frame_resized = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-            success, encoded_image = cv2.imencode('.jpg', frame_resized, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
-            
+            self.archive_writer.append(frame_bytes, duration)
+        except Exception as e:
+            self.logger.error(f"Error archiving frame {saved_count}: {e}")
+        stats.add('write', time.perf_counter() - start_time)
+
+        if len(frames_data) % 100 == 0:
+            self.logger.info(f"Processed {len(frames_data)} frames...")
+
+    def _encode_frame(self, frame, new_width, new_height, saved_count, stats, frame_format=None):
+        """Helper method to resize and encode a single frame, returns None on failure"""
+        try:
+            start_time = time.perf_counter()
+            interpolation = resize_filter_constants(self.resize_filter or DEFAULT_VIDEO_FILTER)[0]
+            if self.layout is not None:
+                frame_resized = self.layout.compose(frame, interpolation)
+            else:
+                frame_resized = cv2.resize(frame, (new_width, new_height), interpolation=interpolation)
+            resized_time = time.perf_counter()
+            stats.add('resize', resized_time - start_time)
+            extension, params, _, _ = FRAME_FORMATS[frame_format or self.encoded_format or 'jpeg']
+            success, encoded_image = cv2.imencode(extension, frame_resized, params(self.quality))
+            stats.add('encode', time.perf_counter() - resized_time)
             if success:
-                frame_bytes = encoded_image.tobytes()
-                frames_data.append((frame_bytes, self.frame_delay))
-                
-                # Save frame for archival
-                frame_path = os.path.join(self.archive_dir, f"frame_{saved_count}.jpg")
-                with open(frame_path, 'wb') as f:
-                    f.write(frame_bytes)
+                return encoded_image.tobytes()
         except Exception as e:
             self.logger.error(f"Error processing frame {saved_count}: {e}")
+        return None
 
-    def process_gif(self):
-        """Process GIF files with or without frame skipping to maintain target FPS"""
-        frames_data = []
-        new_width, new_height = self.get_optimal_monitor_resolution()
-        
-        with Image.open(self.input_path) as img:
-            # Get total number of frames and calculate frame skip
-            n_frames = getattr(img, 'n_frames', 1)
-            frame_durations = []
-            
-            # First pass: get frame durations
-            for frame_idx in range(n_frames):
-                img.seek(frame_idx)
-                frame_duration = img.info.get('duration', 100)  # Default to 100ms if not specified
-                frame_durations.append(frame_duration / 1000.0)  # Convert to seconds
-            
-            if self.enable_frame_skipping:
-                # Calculate effective source FPS
-                avg_frame_duration = sum(frame_durations) / len(frame_durations) if frame_durations else 0.1
-                source_fps = 1.0 / avg_frame_duration if avg_frame_duration > 0 else self.target_fps
-                
-                # Calculate frame skip
-                frame_skip = max(1, round(source_fps / self.target_fps))
-                frame_duration = 1.0 / self.target_fps  # Maintain consistent playback speed
-                
-                self.logger.info(f"GIF Source FPS: {source_fps:.2f}, Target FPS: {self.target_fps}")
-                self.logger.info(f"Frame skip: {frame_skip}, Total frames: {n_frames}")
+    def _encode_gif_frame(self, frame, new_width, new_height, saved_count, stats, frame_format=None):
+        """Helper method to resize and encode a single Pillow frame, returns None on failure"""
+        try:
+            start_time = time.perf_counter()
+            filter_name = self.resize_filter or DEFAULT_GIF_FILTER
+            if self.layout is not None:
+                interpolation, _ = resize_filter_constants(filter_name)
+                frame_resized = Image.fromarray(self.layout.compose(np.asarray(frame), interpolation))
             else:
-                # No frame skipping; adjust frame duration based on target FPS
-                frame_duration = 1.0 / self.target_fps  # Maintain consistent playback speed
-                self.logger.info(f"Processing all GIF frames without frame skipping. Target FPS: {self.target_fps}")
-            
-            frame_count = 0
-            saved_count = 0
-            
-            try:
-                for frame_idx in range(n_frames):
-                    if self.enable_frame_skipping and (frame_idx % frame_skip != 0):
-                        continue
-                    img.seek(frame_idx)
-                    frame = img.convert('RGB')
-                    frame_resized = frame.resize((new_width, new_height), Image.LANCZOS)
-                    
-                    with BytesIO() as buffer:
-                        frame_resized.save(buffer, format='JPEG', quality=self.quality)
-                        frame_bytes = buffer.getvalue()
-                    
-                    frames_data.append((frame_bytes, frame_duration))
-                    
-                    # Save frame for archival
-                    frame_path = os.path.join(self.archive_dir, f"frame_{saved_count}.jpg")
-                    with open(frame_path, 'wb') as f:
-                        f.write(frame_bytes)
-                    saved_count += 1
-                    
-                    if saved_count % 100 == 0:
-                        self.logger.info(f"Processed {saved_count} frames...")
-                    
-                    frame_count += 1
-                    
-            except EOFError:
-                pass
-            
-        self.logger.info(f"Processed {saved_count} frames from {n_frames} source frames")
+                # Pillow alone, so GIFs are processed without importing OpenCV
+                frame_resized = frame.resize((new_width, new_height), getattr(Image, RESIZE_FILTERS[filter_name][1]))
+            resized_time = time.perf_counter()
+            stats.add('resize', resized_time - start_time)
+            _, _, pil_format, params = FRAME_FORMATS[frame_format or self.encoded_format or 'jpeg']
+            with BytesIO() as buffer:
+                frame_resized.save(buffer, format=pil_format, **params(self.quality))
+                frame_bytes = buffer.getvalue()
+            stats.add('encode', time.perf_counter() - resized_time)
+            return frame_bytes
+        except Exception as e:
+            self.logger.error(f"Error processing frame {saved_count}: {e}")
+        return None
+
+    def process_gif(self, frames_data=None):
+        """Process GIF files in a single pass, keeping their per-frame delays.
+
+        Every frame is decoded exactly once by stepping forward through the
+        file. With frame skipping enabled, frames are picked by accumulated
+        time: each target FPS tick shows the frame on screen at that moment,
+        and a frame covering several ticks is kept once with their combined
+        duration. Without frame skipping every frame is kept with its own delay.
+        """
+        new_width, new_height = self.get_optimal_monitor_resolution()
+        if self.encoded_format is None:
+            self.use_frame_format(self.choose_frame_format(new_width, new_height))
+        tick = 1.0 / self.target_fps
+        counts = {'source': 0, 'converted': 0}
+
+        if self.enable_frame_skipping:
+            self.logger.info(f"Resampling GIF by frame delays to {self.target_fps} FPS")
+        else:
+            self.logger.info("Processing all GIF frames with their own delays (frame skipping disabled)")
+
+        def decode_frames():
+            with Image.open(self.input_path) as img:
+                elapsed = 0.0
+                next_tick = 0
+                while True:
+                    start_time = time.perf_counter()
+                    duration = (img.info.get('duration') or DEFAULT_GIF_DURATION_MS) / 1000.0
+                    counts['source'] += 1
+                    frame_end = elapsed + duration
+                    if self.enable_frame_skipping:
+                        # Ticks falling inside [elapsed, frame_end) show this frame
+                        ticks = max(0, math.ceil(frame_end / tick - 1e-6) - next_tick)
+                        next_tick += ticks
+                        keep_duration = ticks * tick
+                    else:
+                        keep_duration = duration
+                    frame = img.convert('RGB') if keep_duration > 0 else None
+                    stats.add('decode', time.perf_counter() - start_time, 1 if frame is not None else 0)
+                    elapsed = frame_end
+                    if frame is not None:
+                        counts['converted'] += 1
+                        yield frame, keep_duration
+                    try:
+                        img.seek(img.tell() + 1)
+                    except EOFError:
+                        return
+
+        stats = self.pipeline_stats()
+        frames_data = self.run_frame_pipeline(self.deduplicate(decode_frames(), stats), new_width, new_height, stats, frames_data,
+                                              encode=self._encode_gif_frame)
+        stats.finish()
+        self.last_pipeline_stats = stats
+        stats.log_summary(self.logger, pooled_stages=('resize', 'encode'))
+
+        self.logger.info(f"Processed {len(frames_data)} frames from {counts['source']} source frames")
         return frames_data
 
     def set_wallpaper(self, image_path):
         """Set wallpaper using the provided image path"""
-        SPI_SETDESKWALLPAPER = 20
-        success = ctypes.windll.user32.SystemParametersInfoW(SPI_SETDESKWALLPAPER, 0, image_path, 2)
+        success = self.sink.set_frame(image_path=image_path)
         if not success:
             self.logger.error("Failed to set wallpaper.")
         return success
 
     def frame_producer(self, frames_data):
-        """Load frames into the queue from memory and loop indefinitely"""
+        """Load frames into the queue from memory and loop indefinitely.
+
+        While preprocessing is still running, only the frames encoded so far are
+        played: in 'loop' mode they are looped, in 'hold' mode each new frame is
+        queued once and the wallpaper stays on the last one until more arrive.
+        """
         self.logger.info("Starting frame producer...")
-        while self.running:
-            for frame_bytes, duration in frames_data:
+        next_index = 0
+        first_queued = False
+        try_staging = self.playback == 'staged'
+        while self.running and self.staged_frames is None:
+            self.frame_added.clear()
+            complete = self.frames_complete.is_set()
+            available = len(frames_data)
+            if complete and available and try_staging:
+                try_staging = False
+                if next_index == 0 and self.sink.needs_file:
+                    # Nothing shown yet (a cache hit): show the first frame from memory rather than after staging them all
+                    self.frame_queue.put(frames_data[0])
+                    first_queued = True
+                staged = self.stage_frames(frames_data)
+                self.startup.mark('staging')
+                if staged is not None:
+                    # The consumer loops over the staged frames once the queue is drained, after the frame already queued
+                    self.staged_frames = staged[1:] + staged[:1] if first_queued else staged
+                    if not self.keep_frames and self.sink.needs_file:
+                        self.release_frames(frames_data)
+                    break
+                if self.sink.needs_file and FrameArchive.exists(self.archive_dir):
+                    # Read frames back from the archive with bounded read-ahead instead of keeping them all around
+                    self.logger.info(f"Streaming frames from {self.archive_dir} through rotating buffers instead.")
+                    self.frame_stream = FrameStream(self.archive_dir, self.stream_budget_mb * 1024 * 1024)
+                    self.frame_stream.start(1 if first_queued else 0)
+                    break
+                self.logger.info("Using rotating buffers.")
+            if available == 0 or (not complete and self.progressive == 'hold' and next_index >= available):
+                # Nothing new to show yet; the timeout notices the end of processing
+                self.frame_added.wait(timeout=0.01)
+                continue
+            if complete or self.progressive == 'loop':
+                next_index = 1 if first_queued else 0
+                first_queued = False
+            for index in range(next_index, available):
                 if not self.running:
                     break
+                frame_bytes, duration = frames_data[index]
+                # Keep the queue shallow until preprocessing finishes so new frames show up promptly
+                while self.running and not self.frames_complete.is_set() and self.frame_queue.qsize() >= 2:
+                    time.sleep(duration / 2)
                 try:
                     self.frame_queue.put((frame_bytes, duration), timeout=1)
                 except queue.Full:
                     self.logger.warning("Frame queue is full. Skipping frame.")
+                    if self.metrics is not None:
+                        self.metrics.queue_full += 1
+            next_index = available
         self.logger.info("Frame producer finished.")
 
+    def stage_frames(self, frames_data):
+        """Write every frame to staging storage once, for playback without per-frame copies or writes.
+
+        Returns the (path, duration) list to loop over, or None if the frames
+        don't fit in the staging budget (next to the rotating buffer files).
+        Sinks that take bytes get the frames as they are, which are
+        memory-mapped views when loaded from the cache.
+        """
+        if not self.sink.needs_file:
+            return list(frames_data)
+
+        total_bytes = sum(len(frame_bytes) for frame_bytes, _ in frames_data)
+        if not self.staging.fits(total_bytes):
+            self.logger.info(f"{total_bytes / 1024 / 1024:.1f}MB of frames don't fit in the "
+                             f"{self.staging.budget_bytes / 1024 / 1024:.0f}MB staging budget.")
+            return None
+        try:
+            os.makedirs(self.staging.path(self.staged_name), exist_ok=True)
+            staged = []
+            for index, (frame_bytes, duration) in enumerate(frames_data):
+                staged_path = self.staging.write(os.path.join(self.staged_name, f"frame_{index}{self.frame_extension}"), frame_bytes)
+                staged.append((staged_path, duration))
+        except (OSError, StagingFull) as e:
+            self.logger.warning(f"Could not stage frames in {self.staging.path(self.staged_name)}: {e}")
+            self.staging.remove(self.staged_name)
+            return None
+        self.logger.info(f"Staged {len(staged)} frames ({total_bytes / 1024 / 1024:.1f}MB) in {self.staging.path(self.staged_name)}")
+        return staged
+
+    def release_frames(self, frames_data):
+        """Drop the in-memory copy of frames that are staged as files, including the archive mapping"""
+        released = sum(len(frame_bytes) for frame_bytes, _ in frames_data)
+        frames_data.clear()
+        if self.frame_archive is not None:
+            self.frame_archive.close()
+            self.frame_archive = None
+        self.logger.info(f"Released {released / 1024 / 1024:.1f}MB of frames kept in memory, playback uses the staged files.")
+
+    def playback_frames(self):
+        """Yield (frame, duration) pairs from the queue, then from the frame stream or staged frames once they take over"""
+        while self.running:
+            if (self.staged_frames is not None or self.frame_stream is not None) and self.frame_queue.empty():
+                break
+            try:
+                item = self.frame_queue.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            self.frame_queue.task_done()
+            yield item
+        if self.frame_stream is not None:
+            while self.running:
+                item = self.frame_stream.next_frame(timeout=0.1)
+                if item is not None:
+                    yield item
+        while self.running:
+            yield from self.staged_frames
+
     def frame_consumer(self):
-        """Consume frames from the queue and set them as wallpaper using in-memory buffers"""
+        """Consume frames from the queue and set them as wallpaper on schedule.
+
+        Each frame owns a time slot on the schedule. A frame whose slot is
+        already over when it is dequeued is dropped instead of being shown
+        late, and if the schedule falls more than MAX_CATCHUP_SECONDS behind
+        it is re-anchored to the current time rather than bursting to catch
+        up. With adaptive pacing, only every Nth frame is shown while the
+        sink is slower than the latency budget.
+        """
         self.logger.info("Starting frame consumer...")
+        metrics = self.metrics
+        controller = FrameRateController(self.latency_budget, window=max(5, self.target_fps)) if self.adaptive else None
+        stride = 1
+        frames_seen = 0
         next_frame_time = time.perf_counter()
+        frames = self.playback_frames()
+        resumed = False
         while self.running:
+            if self.paused:
+                time.sleep(0.05)
+                resumed = True
+                continue
             try:
-                frame_bytes, duration = self.frame_queue.get(timeout=1)
+                wait_start = time.perf_counter()
+                frame, duration = next(frames)
+                now = time.perf_counter()
+                if resumed or now - wait_start > duration:
+                    # Paused, or the queue ran dry (e.g. waiting on preprocessing), don't try to catch up
+                    next_frame_time = now
+                    resumed = False
 
-                with self.buffer_lock:
-                    buffer = self.temp_buffers[self.current_buffer]
-                    buffer.seek(0)
-                    buffer.truncate()
-                    buffer.write(frame_bytes)
-                    buffer.seek(0)
+                frame_start = next_frame_time
+                next_frame_time += duration
+                frames_seen += 1
+                if now >= next_frame_time:
+                    # This frame's slot is already over
+                    if metrics is not None:
+                        metrics.deadline_misses += 1
+                    if now - frame_start > self.MAX_CATCHUP_SECONDS:
+                        self.logger.warning("Frame processing is lagging behind. Re-anchoring the schedule.")
+                        frame_start, next_frame_time = now, now + duration
+                        if metrics is not None:
+                            metrics.reanchors += 1
+                    else:
+                        self.logger.debug("Dropping late frame.")
+                        if metrics is not None:
+                            metrics.frames_dropped += 1
+                        continue
+                elif stride > 1 and frames_seen % stride != 0:
+                    # Adaptive pacing: the previous frame stays up for this frame's slot too
+                    continue
 
-                    # Write buffer to the corresponding temporary file on RAM Disk
-                    temp_image_path = self.temp_image_paths[self.current_buffer]
-                    with open(temp_image_path, 'wb') as temp_image:
-                        temp_image.write(buffer.getvalue())
+                sleep_duration = frame_start - time.perf_counter()
+                if sleep_duration > 0:
+                    time.sleep(sleep_duration)
+                if not self.running:
+                    break
 
-                    # Set the wallpaper to the temporary file
+                if isinstance(frame, str):
+                    # Staged frame, the file is already in place
                     start_time = time.perf_counter()
-                    self.set_wallpaper(temp_image_path)
+                    self.set_wallpaper(frame)
                     end_time = time.perf_counter()
-                    self.logger.debug(f"Set wallpaper in {end_time - start_time:.4f} seconds")
+                elif self.sink.needs_file:
+                    with self.buffer_lock:
+                        buffer = self.temp_buffers[self.current_buffer]
+                        buffer.seek(0)
+                        buffer.truncate()
+                        buffer.write(frame)
+                        buffer.seek(0)
 
-                    # Switch to the next buffer
-                    self.current_buffer = (self.current_buffer + 1) % self.buffer_count
+                        # Write buffer to the corresponding temporary file in staging storage
+                        write_start = time.perf_counter()
+                        temp_image_path = self.staging.write(self.temp_image_names[self.current_buffer], buffer.getvalue())
 
-                # Calculate the next frame time
-                next_frame_time += duration
-                sleep_duration = next_frame_time - time.perf_counter()
-                if sleep_duration > 0:
-                    time.sleep(sleep_duration)
+                        # Set the wallpaper to the temporary file
+                        start_time = time.perf_counter()
+                        if metrics is not None:
+                            metrics.frame_write_latency.observe(start_time - write_start)
+                        self.set_wallpaper(temp_image_path)
+                        end_time = time.perf_counter()
+
+                        # Switch to the next buffer
+                        self.current_buffer = (self.current_buffer + 1) % self.buffer_count
                 else:
-                    self.logger.warning("Frame processing is lagging behind.")
+                    # The sink takes the encoded bytes directly
+                    start_time = time.perf_counter()
+                    self.sink.set_frame(frame_bytes=frame)
+                    end_time = time.perf_counter()
 
-                self.frame_queue.task_done()
-            except queue.Empty:
-                continue
+                self.logger.debug(f"Set wallpaper in {end_time - start_time:.4f} seconds")
+                if controller is not None:
+                    new_stride = controller.observe(end_time - start_time)
+                    if new_stride != stride:
+                        self.logger.info(f"Set wallpaper averages {controller.average * 1000:.1f} ms against a "
+                                         f"{self.latency_budget * 1000:.1f} ms per-frame budget, showing every {new_stride} frame(s).")
+                        stride = new_stride
+                if metrics is not None:
+                    metrics.set_wallpaper_latency.observe(end_time - start_time)
+                    metrics.frame_shown(end_time, frame_start, self.frame_queue.qsize())
+                    metrics.stride = stride
+                if self.first_frame_time is None:
+                    self.first_frame_time = end_time
+                    self.startup.mark('first frame')
+                    self.logger.info(f"First frame shown {(end_time - self.start_time) * 1000:.0f} ms after start")
+                    self.logger.info(f"Startup: {self.startup.summary()}")
+                    if metrics is not None:
+                        metrics.startup_ms = self.startup.breakdown()
+            except StopIteration:
+                break
             except Exception as e:
                 self.logger.error(f"Error in frame consumer: {e}")
 
         self.logger.info("Frame consumer finished.")
 
-    def cleanup(self):
-        """Clean up resources"""
+    def metrics_writer(self):
+        """Periodically rewrite the metrics file while the animation runs"""
+        while self.running:
+            time.sleep(self.metrics_interval)
+            try:
+                self.metrics.write(self.metrics_file)
+            except OSError as e:
+                self.logger.error(f"Failed to write metrics to {self.metrics_file}: {e}")
+
+    def stop(self):
+        """Stop playback, waiting for the consumer to finish the frame it is on"""
+        self.running = False
+        self.cancelled.set()
+        if self.consumer_thread is not None:
+            self.consumer_thread.join(timeout=5)
+
+    def cleanup(self, keep_shared=False):
+        """Clean up resources; with ``keep_shared`` the sink and staging storage are left for the next animator"""
         self.logger.info("Cleaning up resources...")
+        self.cancelled.set()
+        self.staged_frames = None
+        if self.staging is not None:
+            try:
+                # Delete this animator's frame files from staging storage
+                for name in self.temp_image_names:
+                    self.staging.remove(name)
+                self.staging.remove(self.staged_name)
+            except Exception as e:
+                self.logger.error(f"Error deleting temp files: {e}")
+
+        if self.frame_stream is not None:
+            self.logger.debug(f"Frame stream waited on reads {self.frame_stream.underruns} time(s)")
+            self.frame_stream.close()
+            self.frame_stream = None
+
+        if self.frame_archive is not None:
+            self.frame_archive.close()
+            self.frame_archive = None
+
+        if keep_shared:
+            return
+        self.sink.close()
+        if self.owns_staging:
+            self.staging.close()
+
+    def preprocess(self, frames_data=None):
+        """Process the input file into a new cache entry, marking frames as complete when done"""
+        entry_dir = self.archive_dir
+        self.archive_writer = None
+        finished = False
         try:
-            # Delete the temporary frame files from the RAM disk
-            for temp_path in self.temp_image_paths:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                    self.logger.debug(f"Deleted temporary frame file {temp_path}")
+            # Inside the try, so a build that cannot even start still marks frames as complete
+            build_dir = self.build_path = self.cache.begin(entry_dir)
+            if self.frame_store == 'delta':
+                self.archive_writer = DeltaFrameWriter(build_dir, self.encoded_format, self.quality, self.logger)
+            else:
+                self.archive_writer = FrameArchiveWriter(build_dir)
+            if self.is_video_file():
+                frames_data = self.process_video(frames_data)
+            else:
+                frames_data = self.process_gif(frames_data)
+            self.archive_writer.close()
+            finished = True
+        except PreprocessCancelled as e:
+            self.logger.info(f"Processing of {self.input_path} cancelled, {e}")
         except Exception as e:
-            self.logger.error(f"Error deleting temp files: {e}")
+            self.logger.error(f"Error while processing {self.input_path}: {e}")
+        finally:
+            build_dir, self.build_path = self.build_path, None
+            try:
+                if self.archive_writer is not None:
+                    self.archive_writer.close()
+                if finished and frames_data:
+                    self.cache.publish(build_dir, entry_dir, self.build_manifest(frames_data))
+                    self.cache.evict(keep=[entry_dir, *self.pinned_entries])
+                elif build_dir is not None:
+                    self.cache.discard(build_dir)
+            except Exception as e:
+                self.logger.error(f"Failed to publish frames to cache: {e}")
+            self.frames_complete.set()
+        if finished and frames_data:
+            self.logger.info(f"Preprocessing finished with {len(frames_data)} frames.")
+        return frames_data
+
+    def build_manifest(self, frames_data):
+        """Describe a finished archive for the frame cache"""
+        return {
+            'key': self.cache_key,
+            'source': {'path': os.path.abspath(self.input_path), 'digest': self.source_digest,
+                       'width': self.source_dimensions[0] if self.source_dimensions else None,
+                       'height': self.source_dimensions[1] if self.source_dimensions else None},
+            'params': self.cache_params(),
+            'frame_count': len(frames_data),
+            'frame_delay': self.frame_delay,
+            'dedup': dict(self.dedup_stats, threshold=self.dedup_threshold),
+            'layout': self.layout.describe() if self.layout is not None else None,
+            'frame_format': self.encoded_format or 'jpeg',
+            'format_trial': self.format_trial,
+            'frame_store': self.frame_store,
+            'archive': ({'data': DeltaFrameStore.DATA_FILE, 'index': DeltaFrameStore.INDEX_FILE,
+                         'version': DeltaFrameStore.FORMAT_VERSION, 'delta': self.archive_writer.summary()}
+                        if isinstance(self.archive_writer, DeltaFrameWriter) else
+                        {'data': FrameArchive.DATA_FILE, 'index': FrameArchive.INDEX_FILE,
+                         'version': FrameArchive.FORMAT_VERSION}),
+        }
+
+    def frames_stored(self):
+        """Whether this animator's cache entry holds frames in its frame store's format"""
+        if self.frame_store == 'delta':
+            return DeltaFrameStore.exists(self.archive_dir)
+        return FrameArchive.exists(self.archive_dir)
 
-        # Remove the RAM disk only if it was created by the script
-        self.remove_ram_disk()
+    def load_frames(self):
+        """Find this animator's frames in the cache, or process the input file.
+
+        Returns (frames_data, preprocess_thread). With progressive playback the
+        thread, not started yet, fills frames_data while playback runs;
+        otherwise it is None and frames_data is empty if nothing could be loaded.
+        """
+        # Load frames if a complete cache entry exists, otherwise process them
+        self.cache.evict(keep=[self.archive_dir, *self.pinned_entries])
+        preprocess_thread = None
+        manifest = self.cache.lookup(self.archive_dir)
+        cached = manifest is not None and self.frames_stored()
+        self.startup.mark('cache lookup')
+        if cached:
+            # Everything playback needs is in the manifest and archive, the source is never opened
+            self.use_frame_format(manifest.get('frame_format', 'jpeg'))
+            source = manifest.get('source', {})
+            if source.get('width') and source.get('height'):
+                self.source_dimensions = (source['width'], source['height'])
+        if self.frame_store == 'delta':
+            # Keyframes, masks and changed tiles stay resident, frames are rebuilt just ahead of playback
+            if not cached:
+                self.logger.info("No cached frames found. Processing input file into a delta store...")
+                if not self.preprocess(FrameTally()):
+                    return [], None
+            frames_data = self.frame_stream = DeltaFrameStore(self.archive_dir, self.frame_delay, self.logger)
+            self.logger.info(f"Delta store: {self.frame_stream.describe()}")
+            self.frame_stream.start()
+            self.frames_complete.set()
+        elif self.playback == 'stream':
+            # Only the archive on disk and the read-ahead ring hold frames
+            if not cached:
+                self.logger.info("No cached frames found. Processing input file before streaming playback...")
+                if not self.preprocess(FrameTally()):
+                    return [], None
+            self.logger.info(f"Streaming frames from {self.archive_dir} with a {self.stream_budget_mb}MB read-ahead buffer...")
+            frames_data = self.frame_stream = FrameStream(self.archive_dir, self.stream_budget_mb * 1024 * 1024)
+            self.frame_stream.start()
+            self.frames_complete.set()
+        elif cached:
+            self.logger.info("Loading frames from archive...")
+            frames_data = self.load_frames_from_archive()
+            self.frames_complete.set()
+        elif self.progressive == 'off':
+            self.logger.info("No cached frames found. Processing input file...")
+            frames_data = self.preprocess()
+        else:
+            self.logger.info(f"No cached frames found. Processing input file with progressive playback ({self.progressive})...")
+            frames_data = []
+            preprocess_thread = threading.Thread(target=self.preprocess, args=(frames_data,), name="preprocess", daemon=True)
+        self.startup.mark('load')
+        return frames_data, preprocess_thread
+
+    def start_playback(self, frames_data, preprocess_thread=None):
+        """Start the playback threads for frames returned by load_frames"""
+        # Here rather than in __init__, so a daemon item prepared in the background doesn't change the desktop early
+        if self.layout_mode is not None:
+            self.sink.span_monitors()
+        else:
+            self.sink.unspan_monitors()
+        self.running = True
+
+        # Start producer and consumer threads; streamed frames go straight to the consumer
+        self.consumer_thread = threading.Thread(target=self.frame_consumer, daemon=True)
+
+        if preprocess_thread is not None:
+            preprocess_thread.start()
+        if self.frame_stream is None:
+            threading.Thread(target=self.frame_producer, args=(frames_data,), daemon=True).start()
+        self.consumer_thread.start()
+        if self.metrics is not None:
+            threading.Thread(target=self.metrics_writer, name="metrics", daemon=True).start()
+
+    def out_of_frames(self, frames_data):
+        """Whether processing finished without leaving any frames to play"""
+        return self.frames_complete.is_set() and not frames_data and self.staged_frames is None
 
     def run_animation(self):
         """Run the wallpaper animation"""
         self.logger.info("Initializing wallpaper animator...")
 
         try:
-            # Create RAM disk frame directory if not exists
-            self.frames_dir = os.path.join(self.ram_disk_path, f"{self.input_filename}_{self.input_extension}")
-            os.makedirs(self.frames_dir, exist_ok=True)
-
-            # Load frames if already archived, otherwise process them
-            existing_frame_files = sorted(Path(self.archive_dir).glob("frame_*.jpg"),
-                                          key=lambda x: int(x.stem.split('_')[1]))
-            if existing_frame_files:
-                self.logger.info("Loading frames from archive...")
-                self.load_frames_from_archive()
-                frames_data = self.load_frames_from_directory()
-            else:
-                self.logger.info("No existing frames found. Processing input file...")
-                if self.is_video_file():
-                    frames_data = self.process_video()
-                else:
-                    frames_data = self.process_gif()
-
-            if not frames_data:
+            frames_data, preprocess_thread = self.load_frames()
+            if preprocess_thread is None and not frames_data:
                 self.logger.error("No frames were processed or loaded!")
                 return
 
-            self.running = True
-
-            # Start producer and consumer threads
-            producer_thread = threading.Thread(target=self.frame_producer, args=(frames_data,), daemon=True)
-            consumer_thread = threading.Thread(target=self.frame_consumer, daemon=True)
-
-            producer_thread.start()
-            consumer_thread.start()
-
+            self.start_playback(frames_data, preprocess_thread)
             self.logger.info(f"Animation started with {len(frames_data)} frames. Press Ctrl+C to restart.")
 
             while self.running:
                 time.sleep(0.1)
+                if self.out_of_frames(frames_data):
+                    self.logger.error("No frames were processed or loaded!")
+                    self.running = False
 
         except Exception as e:
             self.logger.error(f"Error during animation: {e}")
             self.running = False
             self.cleanup()
 
+def load_playlist(path):
+    """Media files to play from a folder (in name order), a playlist file (one path per line) or a single media file"""
+    path = Path(path)
+    media_extensions = VIDEO_EXTENSIONS | {'.gif'}
+    if path.is_dir():
+        return [str(p) for p in sorted(path.iterdir()) if p.suffix.lower() in media_extensions]
+    if path.suffix.lower() in media_extensions:
+        return [str(path)]
+    items = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                # Relative entries are relative to the playlist, like in .m3u files
+                items.append(str(path.parent / line) if not os.path.isabs(line) else line)
+    return items
+
+class DaemonControlHandler(socketserver.StreamRequestHandler):
+    """One line per command in, one line per reply out"""
+    def handle(self):
+        for line in self.rfile:
+            reply = self.server.wallpaper_daemon.handle_command(line.decode('utf-8', 'replace').strip())
+            self.wfile.write((reply + "\n").encode('utf-8'))
+
+class DaemonControlServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+class WallpaperDaemon:
+    """Play a playlist in one long-lived process, controlled over a local socket.
+
+    The sink, monitors, staging storage and frame cache outlive individual items.
+    While one item plays, the next is processed into the cache on a
+    background worker; at a switch its frames are mapped and staged before
+    the current item stops, so the wallpaper goes straight from one to the
+    other. Commands: next, pause, resume, reload, fps N, status, quit.
+    """
+    def __init__(self, items, animator_kwargs, interval, port, logger):
+        self.items = items
+        self.animator_kwargs = dict(animator_kwargs, monitors=animator_kwargs.get('monitors') or detect_monitors_native() or detect_monitors())
+        self.interval = interval  # Seconds each item plays before the next one
+        self.port = port
+        self.logger = logger
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prepare")
+        self.current = None
+        self.index = 0
+        self.pending = None  # (index, animator, future) of the item to switch to
+        self.started = 0.0
+        self.switch_requested = False
+        self.paused = False
+        self.paused_at = None
+        self.running = False
+
+    def build(self, index):
+        animator = EnhancedWallpaperAnimator(input_path=self.items[index], **self.animator_kwargs)
+        if self.current is not None:
+            animator.pinned_entries.add(self.current.archive_dir)
+        return animator
+
+    def prepare(self, animator):
+        """Background worker: make sure an animator's frames are in the cache"""
+        if animator.cache.lookup(animator.archive_dir) is not None and animator.frames_stored():
+            return True
+        animator.logger.info(f"Preparing {animator.input_path} in the background...")
+        return bool(animator.preprocess(FrameTally()))
+
+    def queue_item(self, index):
+        """Start preparing the item to switch to next, replacing any item queued before"""
+        if self.pending is not None:
+            _, stale, future = self.pending
+            future.add_done_callback(lambda _: stale.cleanup(keep_shared=True))
+        animator = self.build(index)
+        self.pending = (index, animator, self.executor.submit(self.prepare, animator))
+
+    def switch_to_pending(self):
+        index, animator, future = self.pending
+        self.pending = None
+        frames_data = None
+        try:
+            if future.result():
+                frames_data, _ = animator.load_frames()
+        except Exception as e:
+            self.logger.error(f"Could not prepare {animator.input_path}: {e}")
+        if not frames_data:
+            self.logger.error(f"No frames for {animator.input_path}, skipping it.")
+            animator.cleanup(keep_shared=True)
+            if len(self.items) > 1:
+                self.queue_item((index + 1) % len(self.items))
+            return
+        if animator.playback == 'staged' and animator.frame_stream is None:
+            animator.staged_frames = animator.stage_frames(frames_data)
+            animator.startup.mark('staging')
+
+        previous = self.current
+        previous.stop()
+        animator.paused = self.paused
+        animator.start_playback(frames_data)
+        previous.cleanup(keep_shared=True)
+        self.current, self.index, self.started = animator, index, time.monotonic()
+        self.logger.info(f"Now playing {animator.input_path} ({index + 1}/{len(self.items)}, {len(frames_data)} frames)")
+
+    def handle_command(self, command):
+        """Apply one control command and return the reply line"""
+        words = command.split()
+        if not words:
+            return "error empty command"
+        name, arguments = words[0].lower(), words[1:]
+        with self.lock:
+            if name == 'next':
+                if self.pending is None:
+                    self.queue_item((self.index + 1) % len(self.items))
+                self.switch_requested = True
+                return f"ok switching to {self.items[self.pending[0]]}"
+            if name in ('pause', 'resume'):
+                paused = name == 'pause'
+                if paused != self.paused:
+                    # Time spent paused doesn't count towards the item's interval
+                    self.paused_at, self.started = (time.monotonic(), self.started) if paused else (None, self.started + time.monotonic() - self.paused_at)
+                self.paused = self.current.paused = paused
+                return f"ok {name}d"
+            if name == 'reload':
+                self.queue_item(self.index)
+                self.switch_requested = True
+                return f"ok reloading {self.items[self.index]}"
+            if name == 'fps':
+                try:
+                    fps = int(arguments[0])
+                    if fps <= 0:
+                        raise ValueError
+                except (IndexError, ValueError):
+                    return "error usage: fps N (a positive integer)"
+                self.animator_kwargs['target_fps'] = fps
+                self.queue_item(self.index)
+                self.switch_requested = True
+                return f"ok fps {fps}"
+            if name == 'status':
+                pending = "none"
+                if self.pending is not None:
+                    pending = f"{self.items[self.pending[0]]} ({'ready' if self.pending[2].done() else 'preparing'})"
+                return (f"ok playing {self.current.input_path} ({self.index + 1}/{len(self.items)}) at {self.current.target_fps} fps"
+                        f"{', paused' if self.paused else ''}; next {pending}")
+            if name == 'quit':
+                self.running = False
+                return "ok quitting"
+        return f"error unknown command {name!r}"
+
+    def run(self):
+        server = DaemonControlServer(('127.0.0.1', self.port), DaemonControlHandler)
+        server.wallpaper_daemon = self
+        serving = False
+        self.current = self.build(0)
+        # Later items share the first item's staging storage
+        self.animator_kwargs['staging'] = self.current.staging
+        try:
+            frames_data, preprocess_thread = self.current.load_frames()
+            if preprocess_thread is None and not frames_data:
+                self.logger.error(f"No frames were processed or loaded for {self.items[0]}!")
+                return
+            self.current.start_playback(frames_data, preprocess_thread)
+            self.started = time.monotonic()
+            self.running = True
+
+            threading.Thread(target=server.serve_forever, name="control", daemon=True).start()
+            serving = True
+            self.logger.info(f"Daemon listening for commands on 127.0.0.1:{self.port} with {len(self.items)} item(s)")
+            while self.running:
+                time.sleep(0.1)
+                with self.lock:
+                    # Prepare the next item once the current one no longer needs the CPU
+                    if self.pending is None and len(self.items) > 1 and self.current.frames_complete.is_set():
+                        self.queue_item((self.index + 1) % len(self.items))
+                    due = self.switch_requested or (not self.paused and time.monotonic() - self.started >= self.interval)
+                    if self.pending is not None and due and self.pending[2].done():
+                        self.switch_requested = False
+                        self.switch_to_pending()
+        finally:
+            if serving:
+                server.shutdown()
+            server.server_close()
+            self.current.stop()
+            if self.pending is not None and not self.pending[2].done():
+                self.logger.info("Waiting for background preparation to finish...")
+            self.executor.shutdown(wait=True)
+            if self.pending is not None:
+                self.pending[1].cleanup(keep_shared=True)
+            self.current.cleanup(keep_shared=True)
+            self.current.sink.close()
+            if self.current.staging is not None:
+                self.current.staging.close()
+
+def send_daemon_command(command, port):
+    """Send one command to a running daemon and return its reply"""
+    with socket.create_connection(('127.0.0.1', port), timeout=30) as connection:
+        connection.sendall((command + "\n").encode('utf-8'))
+        return connection.makefile('r', encoding='utf-8').readline().strip()
+
+def convert_legacy_archives(source_dir, animator_kwargs):
+    """Pack old AnimationFrames/<name>_<ext>/frame_N.jpg directories into cache entries.
+
+    Each legacy directory is matched to a source file in ``source_dir`` by name
+    and converted with the given animator settings, which must be the ones the
+    frames were originally produced with.
+    """
+    animation_frames_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AnimationFrames")
+    converted = 0
+    for source in sorted(Path(source_dir).iterdir()):
+        if source.suffix.lower() not in VIDEO_EXTENSIONS | {'.gif'}:
+            continue
+        legacy_dir = os.path.join(animation_frames_dir, f"{source.stem.replace('.', '_')}_{source.suffix.lower().strip('.')}")
+        if not os.path.isdir(legacy_dir) or os.path.exists(os.path.join(legacy_dir, FrameCache.MANIFEST)):
+            continue
+        animator = EnhancedWallpaperAnimator(input_path=str(source), **animator_kwargs)
+        try:
+            converted += animator.convert_legacy_archive(legacy_dir)
+        finally:
+            animator.cleanup()
+    logging.getLogger(__name__).info(f"Converted {converted} legacy frame directories.")
+
+def find_media_files(patterns):
+    """Media files named by paths, directories (searched recursively) or glob patterns, each listed once"""
+    media_extensions = VIDEO_EXTENSIONS | {'.gif'}
+    found = {}
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            matches = sorted(path.rglob('*'))
+        elif any(char in pattern for char in '*?['):
+            matches = sorted(Path(match) for match in glob.glob(pattern, recursive=True))
+        elif path.is_file():
+            matches = [path]
+        else:
+            logging.getLogger(__name__).warning(f"{pattern} does not exist, skipping it.")
+            continue
+        for match in matches:
+            if match.suffix.lower() in media_extensions and match.is_file():
+                found.setdefault(os.path.abspath(match), str(match))
+    return list(found.values())
+
+def available_memory_bytes():
+    """Physical memory available to new allocations, or None where it can't be read"""
+    if sys.platform == 'win32':
+        class MEMORYSTATUSEX(ctypes.Structure):
+            _fields_ = [('dwLength', ctypes.c_ulong), ('dwMemoryLoad', ctypes.c_ulong),
+                        ('ullTotalPhys', ctypes.c_ulonglong), ('ullAvailPhys', ctypes.c_ulonglong),
+                        ('ullTotalPageFile', ctypes.c_ulonglong), ('ullAvailPageFile', ctypes.c_ulonglong),
+                        ('ullTotalVirtual', ctypes.c_ulonglong), ('ullAvailVirtual', ctypes.c_ulonglong),
+                        ('ullAvailExtendedVirtual', ctypes.c_ulonglong)]
+
+        status = MEMORYSTATUSEX()
+        status.dwLength = ctypes.sizeof(status)
+        return status.ullAvailPhys if ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(status)) else None
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+class BatchPreprocessor:
+    """Process a library of media files into the frame cache without playing them.
+
+    Files whose cache entry is already complete are skipped, and entries only
+    appear once fully written, so an interrupted batch picks up where it left
+    off when run again. Jobs run in parallel: at most one per core, and a job
+    only starts while the memory its in-flight frames need (estimated from
+    the source size) fits in MEMORY_FRACTION of the available memory, so a
+    folder of 4K clips runs fewer at once than a folder of small GIFs.
+    """
+    MEMORY_FRACTION = 0.75  # Share of available memory batch jobs may plan on
+    JOB_OVERHEAD_MB = 64  # Decoder and encoder state per job on top of its frames
+
+    def __init__(self, files, animator_kwargs, jobs=None, logger=None):
+        self.files = files
+        self.animator_kwargs = animator_kwargs
+        self.logger = logger or logging.getLogger(__name__)
+        cores = os.cpu_count() or 1
+        self.max_jobs = max(1, min(len(files), jobs or cores))
+        if animator_kwargs.get('workers') is None:
+            # Split the cores between jobs instead of every job starting a pool per core
+            self.animator_kwargs = dict(animator_kwargs, workers=max(1, cores // self.max_jobs))
+        available = available_memory_bytes()
+        self.memory_budget = available * self.MEMORY_FRACTION if available else None
+        self.reserved_bytes = 0
+        self.running_jobs = {}  # Animator by input path, for jobs in progress
+        self.results = []
+        self.interrupted = False
+        self.condition = threading.Condition()
+        # Entries made by this batch are never evicted by a later job in it
+        self.pinned_entries = set()
+
+    def estimate_memory(self, animator):
+        """Bytes one preprocessing job holds: decoded and resized frames in flight plus fixed overhead"""
+        width, height = animator.source_size()
+        in_flight = 3 * animator.workers + 2  # Queued for encoding, being encoded, being decoded
+        return in_flight * width * height * 3 * 2 + self.JOB_OVERHEAD_MB * 1024 * 1024
+
+    def admit(self, estimate):
+        """Wait until a job with this memory estimate can start, then reserve its share"""
+        with self.condition:
+            while self.running_jobs and (len(self.running_jobs) >= self.max_jobs or
+                                         (self.memory_budget is not None and self.reserved_bytes + estimate > self.memory_budget)):
+                self.condition.wait(timeout=0.1)
+            self.reserved_bytes += estimate
+
+    def run_job(self, animator, estimate):
+        start_time = time.perf_counter()
+        try:
+            if self.interrupted:
+                return
+            frames = len(animator.preprocess(FrameTally()))
+            seconds = time.perf_counter() - start_time
+            manifest = animator.cache.lookup(animator.archive_dir) if frames else None
+            self.record(animator.input_path, 'done' if manifest else 'failed', manifest, seconds)
+            animator.cleanup()
+        finally:
+            with self.condition:
+                self.reserved_bytes -= estimate
+                del self.running_jobs[animator.input_path]
+                self.condition.notify_all()
+
+    def record(self, path, status, manifest=None, seconds=0.0):
+        with self.condition:
+            self.results.append({'path': path, 'status': status, 'seconds': seconds,
+                                 'frames': manifest.get('frame_count', 0) if manifest else 0,
+                                 'bytes': manifest.get('bytes', 0) if manifest else 0})
+
+    def run(self):
+        """Process every file, returning the per-file results"""
+        memory_note = f", {self.memory_budget / 1024 / 1024:.0f}MB memory budget" if self.memory_budget else ""
+        self.logger.info(f"Batch preprocessing {len(self.files)} file(s) with up to {self.max_jobs} job(s) of "
+                         f"{self.animator_kwargs['workers']} worker(s){memory_note}")
+        threads = []
+        try:
+            for path in self.files:
+                try:
+                    animator = EnhancedWallpaperAnimator(input_path=path, **self.animator_kwargs)
+                except Exception as e:
+                    self.logger.error(f"Could not open {path}: {e}")
+                    self.record(path, 'failed')
+                    continue
+                animator.pinned_entries = self.pinned_entries
+                self.pinned_entries.add(animator.archive_dir)
+                manifest = animator.cache.lookup(animator.archive_dir)
+                if manifest is not None and animator.frames_stored():
+                    self.logger.info(f"{path} is already in the cache, skipping it.")
+                    self.record(path, 'cached', manifest)
+                    animator.cleanup()
+                    continue
+                try:
+                    estimate = self.estimate_memory(animator)
+                except Exception as e:
+                    self.logger.error(f"Could not read {path}: {e}")
+                    self.record(path, 'failed')
+                    animator.cleanup()
+                    continue
+                self.admit(estimate)
+                with self.condition:
+                    self.running_jobs[path] = animator
+                thread = threading.Thread(target=self.run_job, args=(animator, estimate), name=f"batch-{len(threads)}", daemon=True)
+                thread.start()
+                threads.append(thread)
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(timeout=0.1)
+        finally:
+            with self.condition:
+                self.interrupted = True
+                interrupted = list(self.running_jobs.values())
+            for animator in interrupted:
+                self.logger.warning(f"Interrupted while processing {animator.input_path}")
+                animator.cancelled.set()
+            for animator in interrupted:
+                # Preprocess gives up at the next frame and discards its own build; a thread
+                # join interrupted by Ctrl+C can return early, so wait on the animator instead
+                animator.frames_complete.wait(timeout=5)
+                # Unfinished builds are dropped, the next run processes these files again
+                build_path = animator.build_path
+                if build_path is not None:
+                    animator.cache.discard(build_path)
+        return self.results
+
+    def log_summary(self):
+        """Log frames, bytes and throughput for every file, then totals"""
+        self.logger.info(f"{'status':<7} {'frames':>7} {'MB':>8} {'seconds':>8} {'fps':>8} {'MB/s':>7}  file")
+        order = {path: index for index, path in enumerate(self.files)}
+        for result in sorted(self.results, key=lambda result: order.get(result['path'], len(order))):
+            seconds = result['seconds']
+            megabytes = result['bytes'] / 1024 / 1024
+            rates = f"{result['frames'] / seconds:>8.1f} {megabytes / seconds:>7.2f}" if seconds > 0 else f"{'-':>8} {'-':>7}"
+            self.logger.info(f"{result['status']:<7} {result['frames']:>7} {megabytes:>8.1f} {seconds:>8.2f} {rates}  {result['path']}")
+        counts = {status: sum(1 for result in self.results if result['status'] == status) for status in ('done', 'cached', 'failed')}
+        done = [result for result in self.results if result['status'] == 'done']
+        frames = sum(result['frames'] for result in done)
+        megabytes = sum(result['bytes'] for result in done) / 1024 / 1024
+        busy = sum(result['seconds'] for result in done)
+        self.logger.info(f"Batch: {counts['done']} processed ({frames} frames, {megabytes:.1f}MB, "
+                         f"{frames / busy if busy > 0 else 0.0:.1f} fps per job), {counts['cached']} already cached, {counts['failed']} failed")
+
 def main():
     # Set up command-line argument parsing
     parser = argparse.ArgumentParser(description="Enhanced Wallpaper Animator")
     parser.add_argument('input_file', nargs='?', type=str, default="hotelmario.avi",
                         help='Path to the input video or GIF file (e.g., cellBball.mp4 or skullspinning.gif). Defaults to "badapple.mp4" if not provided.')
     parser.add_argument('--fps', type=int, default=15, help='Target frames per second for wallpaper animation (default: 15)')
-    parser.add_argument('--quality', type=int, default=80, help='JPEG quality (0-100, default: 80)')
+    parser.add_argument('--quality', type=int, default=80, help='JPEG/WebP quality (0-100, default: 80)')
+    parser.add_argument('--format', dest='frame_format', choices=list(FRAME_FORMATS) + ['auto'], default='jpeg',
+                        help="Frame file format; 'auto' measures encode time, size and wallpaper apply time on sample frames "
+                             "and picks the smallest format that keeps up with the target FPS (default: jpeg)")
     parser.add_argument('--scale', type=float, default=0.75, help='Scale factor for resolution (default: 0.75)')
-    parser.add_argument('--ram', type=int, default=512, help='RAM disk size in MB (default: 512)')
+    parser.add_argument('--ram', type=int, default=512, help='Staging storage budget in MB, also the size of a RAM disk created with ImDisk (default: 512)')
+    parser.add_argument('--staging', dest='staging_backend', choices=sorted(STAGING_BACKENDS), default=None,
+                        help='Where frame files for the sink are written: ramdisk (an existing RAM disk), imdisk (create one), tmpfs (/dev/shm) '
+                             'or dir (a plain directory). Default: ramdisk, imdisk, then dir on Windows; tmpfs, then dir elsewhere')
+    parser.add_argument('--staging-path', default=None,
+                        help='Root for the staging backend (default: R:\\ for ramdisk/imdisk, /dev/shm for tmpfs, the temp directory for dir)')
     group = parser.add_mutually_exclusive_group()
     group.add_argument('--skip', action='store_true', help='Enable frame skipping (default)')
     group.add_argument('--no-skip', dest='skip', action='store_false', help='Disable frame skipping')
     parser.set_defaults(skip=True)
+    parser.add_argument('--progressive', choices=['loop', 'hold', 'off'], default='loop',
+                        help='Start playback while preprocessing: loop the frames ready so far, hold the latest one, or wait for the whole file (default: loop)')
+    parser.add_argument('--cache-mb', type=int, default=2048,
+                        help='Disk budget for the AnimationFrames cache in MB, least recently used entries are evicted beyond it (default: 2048)')
+    parser.add_argument('--convert-legacy', metavar='SOURCE_DIR', nargs='?', const='.', default=None,
+                        help='Convert AnimationFrames directories from older versions into cache entries, matching them to sources in SOURCE_DIR (default: current directory), then exit. Pass the settings the frames were made with.')
+    parser.add_argument('--filter', dest='resize_filter', choices=sorted(RESIZE_FILTERS), default=None,
+                        help=f'Resampling filter used to resize frames (default: {DEFAULT_VIDEO_FILTER} for video, {DEFAULT_GIF_FILTER} for GIF)')
+    parser.add_argument('--dedup', dest='dedup_threshold', metavar='BITS', type=int, nargs='?', const=0, default=None,
+                        help='Merge consecutive frames whose perceptual hashes differ by at most BITS of 256 into one longer frame (default when given: 0)')
+    parser.add_argument('--sink', choices=sorted(WALLPAPER_SINKS), default=None,
+                        help='Where frames are delivered: windows (SystemParametersInfoW), command (external setter such as feh) or memory (headless, for profiling). Default: windows on Windows, otherwise command if --sink-command is given, else memory')
+    parser.add_argument('--sink-command', default=None,
+                        help=f'Wallpaper setter command for --sink command, {{path}} is replaced with the frame file (default: "{CommandSink.DEFAULT_COMMAND}")')
+    parser.add_argument('--playback', choices=['staged', 'queue', 'stream'], default='staged',
+                        help="'staged' writes every frame to staging storage once and loops over the files, "
+                             "'queue' rewrites rotating buffer files for every frame, "
+                             "'stream' reads frames from the cache as they are played (default: staged)")
+    parser.add_argument('--layout', choices=MonitorLayout.MODES, default=None,
+                        help="Compose one spanned frame with a rendition per monitor: 'fit' letterboxes the source on each monitor, "
+                             "'fill' crops it to cover each monitor, 'span' stretches one image across the desktop "
+                             "(default: one frame sized for the largest monitor)")
+    parser.add_argument('--frame-store', choices=['archive', 'delta'], default='archive',
+                        help="'archive' caches every frame as a whole image; 'delta' caches keyframes plus the tiles that changed "
+                             "between frames and rebuilds frames just ahead of playback, much smaller for mostly static loops (default: archive)")
+    parser.add_argument('--stream-mb', type=int, default=32, help='Read-ahead buffer for --playback stream in MB (default: 32)')
+    adaptive_group = parser.add_mutually_exclusive_group()
+    adaptive_group.add_argument('--adaptive', action='store_true', help='Show every Nth frame while set_wallpaper is slower than the latency budget (default)')
+    adaptive_group.add_argument('--no-adaptive', dest='adaptive', action='store_false', help='Always try to show every frame')
+    parser.set_defaults(adaptive=True)
+    parser.add_argument('--latency-budget-ms', type=float, default=None,
+                        help='Set-wallpaper latency budget for adaptive pacing in ms (default: half a frame at the target FPS)')
+    parser.add_argument('--metrics-file', default=None,
+                        help='Periodically write playback metrics to this file: Prometheus text format for *.prom, JSON otherwise (default: off)')
+    parser.add_argument('--metrics-interval', type=float, default=5.0, help='Seconds between metrics file updates (default: 5)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Number of resize/encode worker threads for preprocessing (default: CPU count)')
+    parser.add_argument('--pipeline', choices=['threaded', 'inline'], default='threaded',
+                        help="'threaded' decodes, resizes/encodes and writes frames on separate threads; 'inline' handles one frame "
+                             "at a time on a single thread, slower but with the least memory in flight (default: threaded)")
+    parser.add_argument('--release-frames', dest='keep_frames', action='store_false',
+                        help='Drop frames from memory once they are staged as files; only the staged files are kept for playback')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep running and rotate through input_file as a playlist: a folder of media or a file listing one path per line')
+    parser.add_argument('--interval', type=float, default=300.0, help='Seconds each playlist item plays in --daemon mode (default: 300)')
+    parser.add_argument('--control-port', type=int, default=47800, help='Local TCP port the daemon listens on for commands (default: 47800)')
+    parser.add_argument('--send', metavar='COMMAND', nargs='+', default=None,
+                        help='Send a command to a running daemon and exit: next, pause, resume, reload, fps N, status or quit')
+    parser.add_argument('--batch', metavar='PATH_OR_GLOB', nargs='+', default=None,
+                        help='Process media files into the frame cache without playing them, then exit. Takes files, folders (searched recursively) '
+                             'and glob patterns; files already cached are skipped, so an interrupted batch resumes where it stopped')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='Files processed at once by --batch (default: one per core, fewer if their frames would not fit in memory)')
     
     args = parser.parse_args()
+
+    if args.send:
+        print(send_daemon_command(' '.join(args.send), args.control_port))
+        return
+
+    # Exit through SystemExit on SIGTERM so atexit handlers still remove staging files
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+    if args.convert_legacy is not None:
+        convert_legacy_archives(args.convert_legacy, dict(
+            target_fps=args.fps,
+            quality=args.quality,
+            scale_factor=args.scale,
+            ram_disk_size_mb=args.ram,
+            enable_frame_skipping=args.skip,
+            cache_size_mb=args.cache_mb,
+            resize_filter=args.resize_filter,
+            dedup_threshold=args.dedup_threshold,
+            sink=MemorySink()  # Nothing is displayed while converting
+        ))
+        return
+
+    if args.batch is not None:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+        batch = BatchPreprocessor(find_media_files(args.batch), dict(
+            target_fps=args.fps,
+            quality=args.quality,
+            scale_factor=args.scale,
+            enable_frame_skipping=args.skip,
+            workers=args.workers,
+            cache_size_mb=args.cache_mb,
+            resize_filter=args.resize_filter,
+            dedup_threshold=args.dedup_threshold,
+            layout=args.layout,
+            frame_format=args.frame_format,
+            frame_store=args.frame_store,
+            pipeline=args.pipeline,
+            monitors=detect_monitors_native() or detect_monitors(),
+            sink=MemorySink()  # Nothing is displayed while batch processing
+        ), jobs=args.jobs)
+        try:
+            batch.run()
+        except KeyboardInterrupt:
+            batch.logger.info("Batch interrupted. Run it again to process the remaining files.")
+        batch.log_summary()
+        if any(result['status'] == 'failed' for result in batch.results):
+            sys.exit(1)
+        return
+
+    sink_name = args.sink or create_sink(command=args.sink_command).name
+    if sink_name == 'windows':
+        ensure_elevated()
     
-    animator = EnhancedWallpaperAnimator(
-        input_path=args.input_file,
+    animator_kwargs = dict(
         target_fps=args.fps,
         quality=args.quality,
         scale_factor=args.scale,
         ram_disk_size_mb=args.ram,
-        enable_frame_skipping=args.skip
+        enable_frame_skipping=args.skip,
+        workers=args.workers,
+        progressive=args.progressive,
+        cache_size_mb=args.cache_mb,
+        resize_filter=args.resize_filter,
+        dedup_threshold=args.dedup_threshold,
+        metrics_file=args.metrics_file,
+        metrics_interval=args.metrics_interval,
+        adaptive=args.adaptive,
+        latency_budget=args.latency_budget_ms / 1000 if args.latency_budget_ms is not None else None,
+        playback=args.playback,
+        stream_budget_mb=args.stream_mb,
+        layout=args.layout,
+        frame_format=args.frame_format,
+        staging_backend=args.staging_backend,
+        staging_path=args.staging_path,
+        frame_store=args.frame_store,
+        pipeline=args.pipeline,
+        keep_frames=args.keep_frames
     )
+
+    if args.daemon:
+        items = load_playlist(args.input_file)
+        if not items:
+            logging.getLogger(__name__).error(f"No media files found in {args.input_file}")
+            sys.exit(1)
+        daemon = WallpaperDaemon(items, dict(animator_kwargs, sink=create_sink(sink_name, args.sink_command)),
+                                 args.interval, args.control_port, logging.getLogger(__name__))
+        try:
+            daemon.run()
+        except KeyboardInterrupt:
+            daemon.logger.info("Daemon interrupted. Exiting...")
+        return
+
+    animator = EnhancedWallpaperAnimator(input_path=args.input_file, sink=create_sink(sink_name, args.sink_command), **animator_kwargs)
     
     while True:
         try:
@@ -477,19 +3075,14 @@ def main():
             animator.running = False
             animator.cleanup()
             time.sleep(1)  # Short pause before restarting
-            animator = EnhancedWallpaperAnimator(
-                input_path=args.input_file,
-                target_fps=args.fps,
-                quality=args.quality,
-                scale_factor=args.scale,
-                ram_disk_size_mb=args.ram,
-                enable_frame_skipping=args.skip
-            )
+            animator = EnhancedWallpaperAnimator(input_path=args.input_file, sink=create_sink(sink_name, args.sink_command), **animator_kwargs)
             continue
         except Exception as e:
             animator.logger.error(f"Unexpected error: {e}")
             animator.cleanup()
             sys.exit(1)
 
+IMPORT_END = time.perf_counter()
+
 if __name__ == "__main__":
     main()